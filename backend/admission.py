@@ -0,0 +1,139 @@
+import asyncio
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Request
+
+from backend.cache import TTLCache, MISSING
+from backend.metrics import admission_shed_total
+from backend.security import verify_jwt_token
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes")
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", 10000))
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def take(self, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        self.tokens = min(capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+policies: List["AdmissionPolicy"] = []
+
+class AdmissionPolicy:
+    def __init__(
+        self,
+        name: str,
+        concurrency: Optional[int] = None,
+        max_queue: int = 0,
+        queue_timeout: float = 1.0,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        key: str = "ip"
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst or (math.ceil(rate) if rate else None)
+        self.key = key
+        self.active = 0
+        self.queued = 0
+        self.stats = {"admitted": 0, "rate_limited": 0, "queue_full": 0, "queue_timeout": 0, "max_queued": 0}
+        self._semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        # An idle bucket is full again after burst / rate seconds, so it can be forgotten
+        self._buckets = TTLCache(
+            maxsize=ADMISSION_MAX_CLIENTS, ttl=self.burst / rate
+        ) if rate else None
+        policies.append(self)
+
+    async def __call__(self, request: Request):
+        if not ADMISSION_CONTROL:
+            yield
+            return
+
+        if self._buckets is not None:
+            self._check_rate(self._client_key(request))
+        if self._semaphore is None:
+            self.stats["admitted"] += 1
+            yield
+            return
+
+        await self._acquire()
+        self.active += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def _client_key(self, request: Request) -> str:
+        if self.key == "user":
+            authorization = request.headers.get("authorization", "")
+            if authorization.lower().startswith("bearer "):
+                try:
+                    payload = verify_jwt_token(authorization[7:])
+                except ValueError:
+                    payload = None
+                if payload and payload.get("user_id") is not None:
+                    return f"user:{payload['user_id']}"
+        return f"ip:{request.client.host if request.client else '-'}"
+
+    def _check_rate(self, client: str):
+        bucket = self._buckets.get(client)
+        if bucket is MISSING:
+            bucket = TokenBucket(self.burst)
+        wait = bucket.take(self.rate, self.burst)
+        self._buckets.set(client, bucket)
+        if wait > 0:
+            self._shed(429, "rate_limited", wait, "Слишком много запросов, повторите попытку позже")
+
+    async def _acquire(self):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return
+        if self.queued >= self.max_queue:
+            self._shed(503, "queue_full", self.queue_timeout, "Сервер перегружен, повторите попытку позже")
+
+        self.queued += 1
+        self.stats["max_queued"] = max(self.stats["max_queued"], self.queued)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._shed(503, "queue_timeout", self.queue_timeout, "Сервер перегружен, повторите попытку позже")
+        finally:
+            self.queued -= 1
+
+    def _shed(self, status_code: int, reason: str, retry_after: float, detail: str):
+        self.stats[reason] += 1
+        admission_shed_total.inc(self.name, reason)
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "active": self.active,
+            "queued": self.queued,
+            "concurrency": self.concurrency or 0,
+            "clients": len(self._buckets) if self._buckets is not None else 0,
+        }
+
+def get_admission_stats() -> Dict[str, dict]:
+    return {policy.name: policy.get_stats() for policy in policies}
@@ -0,0 +1,110 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import select, insert, delete, func
+
+from backend.database import new_session, read_session, CacheInvalidation
+from backend.leases import PROCESS_ID
+
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", 1))
+CACHE_SYNC_RETENTION = float(os.getenv("CACHE_SYNC_RETENTION", 600))
+
+def _from_json(key):
+    # Tuple tags come back from JSON as lists
+    return tuple(_from_json(part) for part in key) if isinstance(key, list) else key
+
+class CacheSync:
+    def __init__(self, interval: float = CACHE_SYNC_INTERVAL, retention: float = CACHE_SYNC_RETENTION):
+        self.interval = interval
+        self.retention = retention
+        self._caches: Dict[str, Tuple[Callable, Callable]] = {}
+        self._outbox: List[dict] = []
+        self._last_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"published": 0, "applied": 0, "resets": 0, "errors": 0}
+
+    def register(self, name: str, invalidate: Callable, clear: Callable):
+        # Both callbacks change only the local cache, they must not publish again
+        self._caches[name] = (invalidate, clear)
+
+    def publish(self, name: str, keys: Optional[List[Hashable]] = None):
+        # keys=None clears the whole cache in the other processes
+        self._outbox.append({
+            "origin": PROCESS_ID,
+            "cache": name,
+            "keys": None if keys is None else list(keys),
+            "created_at": datetime.now(),
+        })
+
+    async def start(self):
+        if self._task is not None:
+            return
+        async with read_session() as session:
+            self._last_id = (await session.execute(select(func.max(CacheInvalidation.id)))).scalar() or 0
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        if not self._outbox:
+            return
+        rows, self._outbox = self._outbox, []
+        try:
+            async with new_session() as session:
+                await session.execute(insert(CacheInvalidation), rows)
+                await session.execute(delete(CacheInvalidation).where(
+                    CacheInvalidation.created_at < datetime.now() - timedelta(seconds=self.retention)
+                ))
+                await session.commit()
+        except Exception:
+            self._outbox = rows + self._outbox
+            raise
+        self.stats["published"] += len(rows)
+
+    async def sync(self):
+        await self.flush()
+        async with read_session() as session:
+            rows = (await session.execute(
+                select(CacheInvalidation)
+                .where(CacheInvalidation.id > self._last_id)
+                .order_by(CacheInvalidation.id)
+            )).scalars().all()
+        if not rows:
+            return
+
+        # Entries pruned before this worker saw them leave no way to tell what changed
+        if rows[0].id > self._last_id + 1 and self._last_id:
+            self.stats["resets"] += 1
+            for _, clear in self._caches.values():
+                clear()
+
+        for row in rows:
+            if row.origin != PROCESS_ID and row.cache in self._caches:
+                invalidate, clear = self._caches[row.cache]
+                if row.keys is None:
+                    clear()
+                else:
+                    invalidate(*(_from_json(key) for key in row.keys))
+                self.stats["applied"] += 1
+        self._last_id = rows[-1].id
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Ошибка согласования кэшей: {str(e)}")
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "pending": len(self._outbox), "last_id": self._last_id or 0}
+
+cache_sync = CacheSync()
@@ -0,0 +1,157 @@
+import os
+from typing import Dict, Optional
+
+from sqlalchemy import select, func
+
+from backend.cache import TTLCache, MISSING
+from backend.cache_sync import cache_sync
+from backend.database import read_session, Place
+from backend.geo import GEOHASH_PRECISION, cell_size, geohash_cell_count, geohash_cells_in_bbox
+
+CLUSTER_POINTS_ZOOM = int(os.getenv("CLUSTER_POINTS_ZOOM", 15))
+CLUSTER_CACHE_TTL = float(os.getenv("CLUSTER_CACHE_TTL", 300))
+CLUSTER_CACHE_SIZE = int(os.getenv("CLUSTER_CACHE_SIZE", 4096))
+CLUSTER_CELL_PX = 64
+TILE_LEVELS = 2
+MAX_TILES = 64
+MAX_ZOOM = 21
+
+def precision_for_zoom(zoom: int) -> int:
+    # A map tile is 256 px wide and covers 360 / 2^zoom degrees of longitude
+    target = CLUSTER_CELL_PX * 360.0 / (256 * 2 ** zoom)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if cell_size(precision)[1] >= target:
+            return precision
+    return 1
+
+MAX_TILE_PRECISION = max(precision_for_zoom(MAX_ZOOM) - TILE_LEVELS, 1)
+
+class ClusterIndex:
+    def __init__(self, maxsize: int = CLUSTER_CACHE_SIZE, ttl: float = CLUSTER_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generations: Dict[str, int] = {}
+        self._max_generations = maxsize
+        # Part of every key, so a tile loaded before clear() cannot be stored afterwards
+        self._epoch = 0
+        self.stats = {"hits": 0, "misses": 0}
+
+    def invalidate(self, *geohashes: Optional[str], broadcast: bool = True):
+        # Every tile containing the place has a geohash that is a prefix of the place's one
+        for geohash in geohashes:
+            if not geohash:
+                continue
+            for length in range(1, min(len(geohash), MAX_TILE_PRECISION) + 1):
+                prefix = geohash[:length]
+                self._generations[prefix] = self._generations.get(prefix, 0) + 1
+        # Forgetting a single counter could revive a stale tile, so everything is dropped at once
+        if len(self._generations) > self._max_generations:
+            self.clear(broadcast=False)
+        if broadcast:
+            cache_sync.publish("clusters", [geohash for geohash in geohashes if geohash])
+
+    def clear(self, broadcast: bool = True):
+        self._epoch += 1
+        self._generations.clear()
+        self._cache.clear()
+        if broadcast:
+            cache_sync.publish("clusters")
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "size": len(self._cache)}
+
+    async def get_clusters(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        zoom: int,
+        city: Optional[str] = None
+    ) -> dict:
+        precision = precision_for_zoom(zoom)
+        tile_precision = max(precision - TILE_LEVELS, 1)
+        while tile_precision > 1 and geohash_cell_count(
+            min_lat, min_lon, max_lat, max_lon, tile_precision
+        ) > MAX_TILES:
+            tile_precision -= 1
+        # A box wider than the viewport for this zoom is clustered as if the map were zoomed out
+        coarsened = precision > tile_precision + TILE_LEVELS
+        precision = min(precision, tile_precision + TILE_LEVELS)
+        points_only = zoom >= CLUSTER_POINTS_ZOOM and not coarsened
+        tiles = geohash_cells_in_bbox(min_lat, min_lon, max_lat, max_lon, tile_precision)
+
+        clusters = []
+        points = []
+        for tile in tiles:
+            key = (tile, precision, points_only, city, self._epoch, self._generations.get(tile, 0))
+            entry = self._cache.get(key)
+            if entry is MISSING:
+                self.stats["misses"] += 1
+                entry = await self._load_tile(tile, precision, points_only, city)
+                if (self._epoch, self._generations.get(tile, 0)) == key[-2:]:
+                    self._cache.set(key, entry)
+            else:
+                self.stats["hits"] += 1
+            clusters.extend(entry["clusters"])
+            points.extend(entry["points"])
+        return {"zoom": zoom, "precision": precision, "clusters": clusters, "points": points}
+
+    @staticmethod
+    def _tile_filter(query, tile: str, city: Optional[str]):
+        query = query.where(Place.geohash >= tile, Place.geohash < tile + "{")
+        if city:
+            query = query.where(Place.city == city)
+        return query
+
+    async def _load_tile(self, tile: str, precision: int, points_only: bool, city: Optional[str]) -> dict:
+        async with read_session() as session:
+            if points_only:
+                query = self._tile_filter(
+                    select(Place.id, Place.latitude, Place.longitude, Place.name), tile, city
+                )
+                rows = (await session.execute(query.order_by(Place.id))).all()
+                return {"clusters": [], "points": [_point(*row) for row in rows]}
+
+            cell = func.substr(Place.geohash, 1, precision).label("cell")
+            # SQLite takes the bare id, name and coordinates from the row holding max(average_rating)
+            query = self._tile_filter(
+                select(
+                    cell,
+                    func.count(),
+                    func.avg(Place.latitude),
+                    func.avg(Place.longitude),
+                    func.max(Place.average_rating),
+                    Place.id,
+                    Place.latitude,
+                    Place.longitude,
+                    Place.name,
+                ),
+                tile,
+                city
+            ).group_by(cell).order_by(cell)
+            rows = (await session.execute(query)).all()
+
+        clusters = []
+        points = []
+        for geohash, count, latitude, longitude, _, top_id, top_latitude, top_longitude, name in rows:
+            if count == 1:
+                points.append(_point(top_id, top_latitude, top_longitude, name))
+            else:
+                clusters.append({
+                    "cell": geohash,
+                    "count": count,
+                    "lat": latitude,
+                    "lon": longitude,
+                    "top_id": top_id,
+                })
+        return {"clusters": clusters, "points": points}
+
+def _point(place_id: int, latitude: float, longitude: float, name: str) -> dict:
+    return {"id": place_id, "lat": latitude, "lon": longitude, "name": name}
+
+cluster_index = ClusterIndex()
+cache_sync.register(
+    "clusters",
+    lambda *geohashes: cluster_index.invalidate(*geohashes, broadcast=False),
+    lambda: cluster_index.clear(broadcast=False)
+)
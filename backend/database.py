@@ -1,6 +1,6 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy import String, DateTime, Boolean, Text, ForeignKey, Integer, Float, JSON
+from sqlalchemy import String, DateTime, Boolean, Text, ForeignKey, Integer, Float, JSON, Index, event
 from typing import Optional, List
 import os
 from datetime import datetime
@@ -11,8 +11,52 @@ load_dotenv()
 DB_NAME = os.getenv("DB_NAME", "app.db")
 DB_URL = f"sqlite+aiosqlite:///./{DB_NAME}"
 
-engine = create_async_engine(DB_URL, echo=True)
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() in ("1", "true", "yes")
+STORAGE_MODE = os.getenv("STORAGE_MODE", "production")
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", 8))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_WRITE_TIMEOUT = float(os.getenv("SQLITE_WRITE_TIMEOUT", 30))
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record, read_only: bool = False):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def _set_read_pragmas(dbapi_connection, connection_record):
+    _set_sqlite_pragmas(dbapi_connection, connection_record, read_only=True)
+
+if STORAGE_MODE == "production":
+    # A single writer connection serializes writes, readers share WAL snapshots
+    engine = create_async_engine(
+        DB_URL,
+        echo=SQL_ECHO,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=SQLITE_WRITE_TIMEOUT
+    )
+    read_engine = create_async_engine(
+        DB_URL,
+        echo=SQL_ECHO,
+        pool_size=SQLITE_READERS,
+        max_overflow=0
+    )
+    event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    event.listen(read_engine.sync_engine, "connect", _set_read_pragmas)
+else:
+    engine = create_async_engine(DB_URL, echo=SQL_ECHO)
+    read_engine = engine
+
 new_session = async_sessionmaker(engine, expire_on_commit=False)
+read_session = async_sessionmaker(read_engine, expire_on_commit=False)
 
 class Model(DeclarativeBase):
     pass
@@ -34,8 +78,10 @@ class User(Model):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
     last_login: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
-    # Relationships
+    # Legacy JSON favorites, moved into the favorites table by migration 6
     favorite_places: Mapped[List[int]] = mapped_column(JSON, default=list)
+
+    # Relationships
     reviews: Mapped[List["Review"]] = relationship("Review", back_populates="user")
 
     def __repr__(self):
@@ -48,23 +94,108 @@ class Place(Model):
     name: Mapped[str] = mapped_column(String(100))
     description: Mapped[str] = mapped_column(Text)
     address: Mapped[str] = mapped_column(String(200))
-    city: Mapped[str] = mapped_column(String(50))
+    city: Mapped[str] = mapped_column(String(50), index=True)
     contacts: Mapped[str] = mapped_column(String(200))
-    photos: Mapped[str] = mapped_column(JSON, default=list)
-    average_rating: Mapped[float] = mapped_column(Float, default=0.0)
+    photos: Mapped[List[str]] = mapped_column(JSON, default=list)
+    photo_variants: Mapped[List[dict]] = mapped_column(JSON, default=list, server_default="[]")
+    average_rating: Mapped[float] = mapped_column(Float, default=0.0, server_default="0")
+    review_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    geohash: Mapped[Optional[str]] = mapped_column(String(12), nullable=True, index=True)
 
     # Relationships
     reviews: Mapped[List["Review"]] = relationship("Review", back_populates="place")
 
+    __table_args__ = (
+        Index("ix_places_latitude_longitude", "latitude", "longitude"),
+    )
+
     def __repr__(self):
         return f"<Place(id={self.id}, name={self.name}, city={self.city})>"
 
+class Favorite(Model):
+    __tablename__ = "favorites"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    place_id: Mapped[int] = mapped_column(ForeignKey("places.id"), primary_key=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<Favorite(user_id={self.user_id}, place_id={self.place_id})>"
+
+class PlaceToken(Model):
+    __tablename__ = "place_tokens"
+
+    place_id: Mapped[int] = mapped_column(ForeignKey("places.id"), primary_key=True)
+    token: Mapped[str] = mapped_column(String(64), primary_key=True, index=True)
+
+    def __repr__(self):
+        return f"<PlaceToken(place_id={self.place_id}, token={self.token})>"
+
+class PlaceNeighbor(Model):
+    __tablename__ = "place_neighbors"
+
+    place_id: Mapped[int] = mapped_column(ForeignKey("places.id"), primary_key=True)
+    neighbor_id: Mapped[int] = mapped_column(ForeignKey("places.id"), primary_key=True, index=True)
+    score: Mapped[float] = mapped_column(Float)
+
+    def __repr__(self):
+        return f"<PlaceNeighbor(place_id={self.place_id}, neighbor_id={self.neighbor_id}, score={self.score})>"
+
+class GeocodeJob(Model):
+    __tablename__ = "geocode_jobs"
+
+    place_id: Mapped[int] = mapped_column(ForeignKey("places.id"), primary_key=True)
+    status: Mapped[str] = mapped_column(String(20), default="pending", index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<GeocodeJob(place_id={self.place_id}, status={self.status}, attempts={self.attempts})>"
+
+class GeocodeCacheEntry(Model):
+    __tablename__ = "geocode_cache"
+
+    address_key: Mapped[str] = mapped_column(String(300), primary_key=True)
+    latitude: Mapped[float] = mapped_column(Float)
+    longitude: Mapped[float] = mapped_column(Float)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<GeocodeCacheEntry(address_key={self.address_key}, latitude={self.latitude}, longitude={self.longitude})>"
+
+class CacheInvalidation(Model):
+    __tablename__ = "cache_invalidations"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    origin: Mapped[str] = mapped_column(String(50))
+    cache: Mapped[str] = mapped_column(String(20))
+    keys: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, index=True)
+
+    # Ids must never be reused, workers track the last one they applied
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    def __repr__(self):
+        return f"<CacheInvalidation(id={self.id}, cache={self.cache}, origin={self.origin})>"
+
+class JobLease(Model):
+    __tablename__ = "job_leases"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(50))
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+
+    def __repr__(self):
+        return f"<JobLease(name={self.name}, owner={self.owner}, expires_at={self.expires_at})>"
+
 class Review(Model):
     __tablename__ = "reviews"
 
@@ -81,14 +212,15 @@ class Review(Model):
     place: Mapped["Place"] = relationship("Place", back_populates="reviews")
     user: Mapped["User"] = relationship("User", back_populates="reviews")
 
+    __table_args__ = (
+        Index("ix_reviews_place_created", "place_id", "created_at"),
+        Index("ix_reviews_place_rating", "place_id", "rating"),
+        Index("ux_reviews_place_user", "place_id", "user_id", unique=True),
+    )
+
     def __repr__(self):
         return f"<Review(id={self.id}, place_id={self.place_id}, user_id={self.user_id}, rating={self.rating})>"
 
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Model.metadata.create_all)
-    print("Все таблицы созданы")
-
 async def delete_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Model.metadata.drop_all)
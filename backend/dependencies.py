@@ -1,24 +1,43 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from backend.users_crud import UserCrud
 from backend.security import verify_jwt_token
 
 security = HTTPBearer()
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+
     token = credentials.credentials
-    payload = verify_jwt_token(token)
+    try:
+        payload = verify_jwt_token(token)
+    except ValueError:
+        payload = None
     if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
         )
     
-    user = await UserCrud.get_user_by_email(payload.get("email"))
+    if payload.get("user_id") is not None:
+        user = await UserCrud.get_cached_user(payload["user_id"])
+    else:
+        user = await UserCrud.get_user_by_email(payload.get("email"))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
+    request.state.user = user
+    return user
+
+async def get_current_superuser(user = Depends(get_current_user)):
+    if not user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
     return user
\ No newline at end of file
@@ -0,0 +1,120 @@
+import math
+from typing import List, Tuple
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = 111320.0
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    value = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            middle = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= middle:
+                value = (value << 1) | 1
+                lon_range[0] = middle
+            else:
+                value <<= 1
+                lon_range[1] = middle
+        else:
+            middle = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= middle:
+                value = (value << 1) | 1
+                lat_range[0] = middle
+            else:
+                value <<= 1
+                lat_range[1] = middle
+        even = not even
+
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bit = 0
+            value = 0
+
+    return "".join(chars)
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+def decode_geohash(geohash: str) -> Tuple[float, float]:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            middle = (target[0] + target[1]) / 2
+            target[bit ^ 1] = middle
+            even = not even
+
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+def geohash_neighborhood(geohash: str) -> List[str]:
+    latitude, longitude = decode_geohash(geohash)
+    lat_step, lon_step = cell_size(len(geohash))
+    cells = set()
+    for dlat in (-lat_step, 0.0, lat_step):
+        for dlon in (-lon_step, 0.0, lon_step):
+            lat = latitude + dlat
+            if not -90.0 <= lat <= 90.0:
+                continue
+            lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lon, len(geohash)))
+    return sorted(cells)
+
+def _cell_range(low: float, high: float, origin: float, step: float, count: int) -> range:
+    first = min(int((low - origin) // step), count - 1)
+    last = min(int((high - origin) // step), count - 1)
+    return range(max(first, 0), max(last, 0) + 1)
+
+def _bbox_cell_ranges(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                      precision: int) -> Tuple[range, range, float, float]:
+    lat_step, lon_step = cell_size(precision)
+    rows = _cell_range(min_lat, max_lat, -90.0, lat_step, round(180.0 / lat_step))
+    columns = _cell_range(min_lon, max_lon, -180.0, lon_step, round(360.0 / lon_step))
+    return rows, columns, lat_step, lon_step
+
+def geohash_cell_count(min_lat: float, min_lon: float, max_lat: float, max_lon: float, precision: int) -> int:
+    rows, columns, _, _ = _bbox_cell_ranges(min_lat, min_lon, max_lat, max_lon, precision)
+    return len(rows) * len(columns)
+
+def geohash_cells_in_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, precision: int) -> List[str]:
+    rows, columns, lat_step, lon_step = _bbox_cell_ranges(min_lat, min_lon, max_lat, max_lon, precision)
+    return sorted(
+        encode_geohash(-90.0 + (row + 0.5) * lat_step, -180.0 + (column + 0.5) * lon_step, precision)
+        for row in rows
+        for column in columns
+    )
+
+def covered_radius(latitude: float, precision: int) -> float:
+    lat_step, lon_step = cell_size(precision)
+    width = lon_step * METERS_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6)
+    height = lat_step * METERS_PER_DEGREE
+    return min(width, height)
+
+def precision_for_radius(latitude: float, radius_m: float) -> int:
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if covered_radius(latitude, precision) >= radius_m:
+            return precision
+    return 1
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
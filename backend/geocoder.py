@@ -1,56 +1,193 @@
 import asyncio
 import os
-from typing import Optional, Tuple, Dict
+import re
+from datetime import datetime, timedelta
+from typing import Optional, Tuple, Dict, List
 from dotenv import load_dotenv
 import httpx
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.cache import TTLCache, MISSING
+from backend.database import new_session, read_session, GeocodeCacheEntry
 
 load_dotenv()
 
 YANDEX_GEOCODER_API_KEY = os.getenv("GEOCODER_API_KEY")
-GEOCODER_URL = "https://geocode-maps.yandex.ru/1.x/"
+GEOCODER_URL = os.getenv("GEOCODER_URL", "https://geocode-maps.yandex.ru/1.x/")
+GEOCODER_CACHE_TTL = int(os.getenv("GEOCODER_CACHE_TTL", 30 * 24 * 3600))
+GEOCODER_NOT_FOUND_TTL = int(os.getenv("GEOCODER_NOT_FOUND_TTL", 24 * 3600))
+GEOCODER_CACHE_SIZE = int(os.getenv("GEOCODER_CACHE_SIZE", 10000))
+GEOCODER_MAX_CONNECTIONS = int(os.getenv("GEOCODER_MAX_CONNECTIONS", 10))
+
+class GeocoderError(Exception):
+    pass
 
 class YandexGeocoder:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = GEOCODER_URL,
+        cache_ttl: int = GEOCODER_CACHE_TTL,
+        cache_size: int = GEOCODER_CACHE_SIZE,
+        persistent_cache: bool = True
+    ):
         self.api_key = api_key
-        self.base_url = GEOCODER_URL
-    
-    async def geocode_address(self, city: str, address: str) -> Optional[Tuple[float, float]]:
+        self.base_url = base_url
+        self.cache_ttl = cache_ttl
+        self.persistent_cache = persistent_cache
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"hits": 0, "persistent_hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10.0,
+                limits=httpx.Limits(
+                    max_connections=GEOCODER_MAX_CONNECTIONS,
+                    max_keepalive_connections=GEOCODER_MAX_CONNECTIONS
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def normalize_address(city: str, address: str) -> str:
+        text = f"{city}, {address}".lower().replace("ё", "е")
+        text = re.sub(r"[^\w\s]", " ", text)
+        return " ".join(text.split())
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "cache_size": len(self._cache), "inflight": len(self._inflight)}
+
+    async def geocode_address(
+        self,
+        city: str,
+        address: str,
+        raise_errors: bool = False
+    ) -> Optional[List[float]]:
         if not self.api_key:
             print("API ключ Яндекс.Карт не настроен")
             return None
-        
-        full_address = f"{city}, {address}"
-        
+
+        key = self.normalize_address(city, address)
+        cached = self._cache.get(key)
+        if cached is not MISSING:
+            self.stats["hits"] += 1
+            return list(cached) if cached else None
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(key, f"{city}, {address}"))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+
+        try:
+            coordinates = await asyncio.shield(task)
+        except GeocoderError as e:
+            if raise_errors:
+                raise
+            print(f"Ошибка при геокодировании {city}, {address}: {str(e)}")
+            return None
+
+        return list(coordinates) if coordinates else None
+
+    async def _lookup(self, key: str, full_address: str) -> Optional[Tuple[float, float]]:
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(self.base_url, params={
-                    "apikey": self.api_key,
-                    "geocode": full_address,
-                    "format": "json",
-                    "lang": "ru_RU",
-                    "results": 1
-                })
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    features = data.get("response", {}).get("GeoObjectCollection", {}).get("featureMember", [])
-                    
-                    if features:
-                        geo_object = features[0]["GeoObject"]
-                        pos = geo_object["Point"]["pos"]
-                        
-                        lon, lat = map(float, pos.split())
-                        
-                        return [lat, lon]
-                    else:
-                        return None
-                else:
-                    print(f"Ошибка геокодера: {response.status_code}")
-                    return None
-                    
-        except Exception as e:
-            print(f"Ошибка при геокодировании {full_address}: {str(e)}")
+            coordinates = await self._load_persistent(key)
+        except SQLAlchemyError as e:
+            print(f"Ошибка чтения кэша геокодера: {str(e)}")
+            coordinates = None
+        if coordinates:
+            self.stats["persistent_hits"] += 1
+            self._cache.set(key, coordinates)
+            return coordinates
+
+        self.stats["misses"] += 1
+        try:
+            coordinates = await self._request(full_address)
+        except GeocoderError:
+            self.stats["errors"] += 1
+            raise
+
+        if not coordinates:
+            # Unresolvable addresses are remembered for a shorter time, only in memory
+            self._cache.set(key, None, ttl=GEOCODER_NOT_FOUND_TTL)
             return None
-    
-geocoder = YandexGeocoder(YANDEX_GEOCODER_API_KEY)
\ No newline at end of file
+
+        self._cache.set(key, coordinates)
+        try:
+            await self._store_persistent(key, coordinates)
+        except SQLAlchemyError as e:
+            self.stats["errors"] += 1
+            raise GeocoderError(f"Ошибка сохранения кэша геокодера: {str(e)}") from e
+        return coordinates
+
+    async def _request(self, full_address: str) -> Optional[Tuple[float, float]]:
+        try:
+            response = await self.client.get(self.base_url, params={
+                "apikey": self.api_key,
+                "geocode": full_address,
+                "format": "json",
+                "lang": "ru_RU",
+                "results": 1
+            })
+        except httpx.HTTPError as e:
+            raise GeocoderError(str(e)) from e
+
+        if response.status_code != 200:
+            raise GeocoderError(f"Ошибка геокодера: {response.status_code}")
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise GeocoderError("Геокодер вернул не JSON") from e
+
+        try:
+            features = data["response"]["GeoObjectCollection"]["featureMember"]
+            if not features:
+                return None
+
+            geo_object = features[0]["GeoObject"]
+            pos = geo_object["Point"]["pos"]
+
+            lon, lat = map(float, pos.split())
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise GeocoderError(f"Некорректный ответ геокодера: {e!r}") from e
+
+        return (lat, lon)
+
+    async def _load_persistent(self, key: str) -> Optional[Tuple[float, float]]:
+        if not self.persistent_cache:
+            return None
+
+        async with read_session() as session:
+            entry = await session.get(GeocodeCacheEntry, key)
+            if not entry:
+                return None
+            if entry.created_at < datetime.now() - timedelta(seconds=self.cache_ttl):
+                return None
+            return (entry.latitude, entry.longitude)
+
+    async def _store_persistent(self, key: str, coordinates: Tuple[float, float]):
+        if not self.persistent_cache:
+            return
+
+        async with new_session() as session:
+            await session.merge(GeocodeCacheEntry(
+                address_key=key,
+                latitude=coordinates[0],
+                longitude=coordinates[1],
+                created_at=datetime.now()
+            ))
+            await session.commit()
+
+geocoder = YandexGeocoder(YANDEX_GEOCODER_API_KEY)
@@ -0,0 +1,229 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from sqlalchemy import select, update, or_, and_
+
+from backend.database import new_session, read_session, Place, GeocodeJob
+from backend.geocoder import GeocoderError
+from backend.places_crud import PlaceCrud
+
+GEOCODE_WORKERS = int(os.getenv("GEOCODE_WORKERS", 4))
+GEOCODE_MAX_ATTEMPTS = int(os.getenv("GEOCODE_MAX_ATTEMPTS", 5))
+GEOCODE_RETRY_BASE = float(os.getenv("GEOCODE_RETRY_BASE", 2.0))
+GEOCODE_RETRY_MAX = float(os.getenv("GEOCODE_RETRY_MAX", 300.0))
+GEOCODE_LEASE = float(os.getenv("GEOCODE_LEASE", 120.0))
+GEOCODE_POLL_INTERVAL = float(os.getenv("GEOCODE_POLL_INTERVAL", 10.0))
+GEOCODE_POLL_BATCH = int(os.getenv("GEOCODE_POLL_BATCH", 1000))
+
+class GeocodingQueue:
+    def __init__(
+        self,
+        workers: int = GEOCODE_WORKERS,
+        max_attempts: int = GEOCODE_MAX_ATTEMPTS,
+        retry_base: float = GEOCODE_RETRY_BASE,
+        retry_max: float = GEOCODE_RETRY_MAX,
+        lease: float = GEOCODE_LEASE,
+        poll_interval: float = GEOCODE_POLL_INTERVAL
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Set[int] = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.poll_interval > 0:
+            self._tasks.append(asyncio.create_task(self._poll()))
+        await self.resume()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._pending.clear()
+        self._idle.set()
+
+    def submit(self, place_id: int, delay: float = 0.0):
+        if not self.running or place_id in self._pending:
+            return
+        self._pending.add(place_id)
+        self._idle.clear()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, place_id)
+        else:
+            self._queue.put_nowait(place_id)
+
+    async def drain(self):
+        await self._idle.wait()
+
+    async def resume(self, limit: Optional[int] = None) -> int:
+        now = datetime.now()
+        query = (
+            select(GeocodeJob.place_id, GeocodeJob.next_attempt_at)
+            .where(GeocodeJob.status.in_(("pending", "running")))
+            .order_by(GeocodeJob.next_attempt_at)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        async with read_session() as session:
+            jobs = (await session.execute(query)).all()
+
+        # A running job is picked up again only after its lease expires
+        for place_id, next_attempt_at in jobs:
+            delay = max((next_attempt_at - now).total_seconds(), 0.0)
+            self.submit(place_id, delay)
+        return len(jobs)
+
+    async def _poll(self):
+        # Jobs enqueued by other worker processes or by manage commands
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.resume(limit=GEOCODE_POLL_BATCH)
+            except Exception as e:
+                print(f"Ошибка опроса очереди геокодирования: {str(e)}")
+
+    async def enqueue(self, place_ids: List[int]):
+        if not place_ids:
+            return
+        async with new_session() as session:
+            for place_id in place_ids:
+                await session.merge(GeocodeJob(
+                    place_id=place_id,
+                    status="pending",
+                    attempts=0,
+                    last_error=None,
+                    next_attempt_at=datetime.now()
+                ))
+            await session.commit()
+        for place_id in place_ids:
+            self.submit(place_id)
+
+    async def backfill(self, batch_size: int = 100) -> int:
+        total = 0
+        last_id = 0
+        while True:
+            async with new_session() as session:
+                place_ids = (await session.execute(
+                    select(Place.id)
+                    .where(
+                        Place.id > last_id,
+                        or_(Place.latitude.is_(None), Place.longitude.is_(None))
+                    )
+                    .order_by(Place.id)
+                    .limit(batch_size)
+                )).scalars().all()
+            if not place_ids:
+                break
+
+            await self.enqueue(list(place_ids))
+            await self.drain()
+
+            total += len(place_ids)
+            last_id = place_ids[-1]
+            print(f"Геокодирование: обработано {total} мест")
+        return total
+
+    async def _worker(self):
+        while True:
+            place_id = await self._queue.get()
+            try:
+                await self._process(place_id)
+            except Exception as e:
+                # The job row could not be updated; it is retried after the longest backoff
+                print(f"Ошибка задачи геокодирования {place_id}: {str(e)}")
+                self._pending.discard(place_id)
+                self.submit(place_id, self.retry_max)
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, place_id: int):
+        self._pending.discard(place_id)
+        if not self._pending:
+            self._idle.set()
+
+    async def _set_job(self, place_id: int, **values):
+        async with new_session() as session:
+            await session.execute(
+                update(GeocodeJob).where(GeocodeJob.place_id == place_id).values(**values)
+            )
+            await session.commit()
+
+    async def _retry(self, place_id: int, attempts: int, error: str):
+        if attempts >= self.max_attempts:
+            await self._set_job(place_id, status="failed", last_error=error)
+            self._finish(place_id)
+            return
+
+        delay = min(self.retry_base ** attempts, self.retry_max)
+        await self._set_job(
+            place_id,
+            status="pending",
+            last_error=error,
+            next_attempt_at=datetime.now() + timedelta(seconds=delay)
+        )
+        self._pending.discard(place_id)
+        self.submit(place_id, delay)
+
+    async def _claim(self, place_id: int) -> Optional[int]:
+        # Several worker processes may hold the same job, only the one whose update lands runs it
+        now = datetime.now()
+        async with new_session() as session:
+            claimed = (await session.execute(
+                update(GeocodeJob)
+                .where(
+                    GeocodeJob.place_id == place_id,
+                    or_(
+                        GeocodeJob.status == "pending",
+                        and_(GeocodeJob.status == "running", GeocodeJob.next_attempt_at <= now)
+                    )
+                )
+                .values(
+                    status="running",
+                    attempts=GeocodeJob.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=self.lease)
+                )
+            )).rowcount
+            attempts = None
+            if claimed:
+                attempts = (await session.execute(
+                    select(GeocodeJob.attempts).where(GeocodeJob.place_id == place_id)
+                )).scalar()
+            await session.commit()
+        return attempts
+
+    async def _process(self, place_id: int):
+        attempts = await self._claim(place_id)
+        if attempts is None:
+            self._finish(place_id)
+            return
+
+        try:
+            coordinates = await PlaceCrud.update_place_coordinates(place_id, raise_errors=True)
+        except Exception as e:
+            if not isinstance(e, GeocoderError):
+                print(f"Ошибка задачи геокодирования {place_id}: {str(e)}")
+            await self._retry(place_id, attempts, str(e))
+            return
+
+        await self._set_job(place_id, status="done" if coordinates else "not_found", last_error=None)
+        self._finish(place_id)
+
+geocoding_queue = GeocodingQueue()
@@ -0,0 +1,49 @@
+import asyncio
+import os
+from typing import Dict, List
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+PHOTO_VARIANTS = {"thumb": 160, "card": 480, "full": 1600}
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", 80))
+
+def make_photo_variants(path: str) -> Dict[str, str]:
+    stem, _ = os.path.splitext(path)
+    variants = {}
+    with Image.open(path) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        for name, size in PHOTO_VARIANTS.items():
+            variant_path = f"{stem}_{name}.webp"
+            variants[name] = variant_path
+            if os.path.exists(variant_path):
+                continue
+
+            variant = image.copy()
+            variant.thumbnail((size, size))
+            temp_path = f"{variant_path}.tmp"
+            variant.save(temp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(temp_path, variant_path)
+    return variants
+
+async def generate_photo_variants(place_id: int, photo_paths: List[str]):
+    from backend.places_crud import PlaceCrud
+
+    if Image is None:
+        print("Pillow не установлен, уменьшенные копии фотографий не создаются")
+        return
+
+    variants = []
+    for path in photo_paths:
+        try:
+            variants.append(await asyncio.to_thread(make_photo_variants, path))
+        except Exception as e:
+            print(f"Не удалось обработать фотографию {path}: {str(e)}")
+            variants.append({})
+
+    await PlaceCrud.set_photo_variants(place_id, variants)
@@ -0,0 +1,38 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from backend.database import new_session, JobLease
+
+# Identifies this worker process in leases and in the cache invalidation log
+PROCESS_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+async def acquire_lease(name: str, ttl: float) -> bool:
+    now = datetime.now()
+    expires_at = now + timedelta(seconds=ttl)
+    async with new_session() as session:
+        await session.execute(
+            sqlite_insert(JobLease)
+            .values(name=name, owner=PROCESS_ID, expires_at=expires_at)
+            .on_conflict_do_nothing()
+        )
+        # Taken over only when the previous owner stopped renewing it
+        result = await session.execute(
+            update(JobLease)
+            .where(JobLease.name == name, or_(JobLease.owner == PROCESS_ID, JobLease.expires_at < now))
+            .values(owner=PROCESS_ID, expires_at=expires_at)
+        )
+        await session.commit()
+    return result.rowcount == 1
+
+async def release_lease(name: str):
+    async with new_session() as session:
+        await session.execute(
+            update(JobLease)
+            .where(JobLease.name == name, JobLease.owner == PROCESS_ID)
+            .values(expires_at=datetime.now())
+        )
+        await session.commit()
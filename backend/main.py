@@ -1,23 +1,50 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from backend.users_router import user_router
-from backend.places_router import places_router
-from backend.database import create_tables, delete_tables
+from backend.places_router import places_router, UPLOAD_DIR
+from backend.database import delete_tables, engine, read_engine
+from backend.migrations import check_schema, migrate
+from backend.geocoder import geocoder
+from backend.geocoding_queue import geocoding_queue
+from backend.recommendations import neighbor_refresher
+from backend.security import hashing_pool
+from backend.response_cache import response_cache
+from backend.static_files import ContentAddressedStaticFiles
+from backend.tokenizer import warm_up as warm_up_tokenizer
+from backend.metrics import MetricsMiddleware, instrument_engines, render_metrics
+from backend.admission import get_admission_stats
+from backend.snapshots import index_snapshots
+from backend.clusters import cluster_index
+from backend.cache_sync import cache_sync
 from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
-import nltk
-nltk.download('stopwords')
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     #await delete_tables()
-    await create_tables()
+    if MIGRATE_ON_STARTUP:
+        await migrate()
+    await check_schema()
     print("База данных готова к работе")
+    tokenizer_warmup = asyncio.create_task(asyncio.to_thread(warm_up_tokenizer))
+    index_snapshots.current()
+    await cache_sync.start()
+    await geocoding_queue.start()
+    neighbor_refresher.start()
     yield
+    await tokenizer_warmup
+    await neighbor_refresher.stop()
+    await geocoding_queue.stop()
+    await cache_sync.stop()
+    await geocoder.aclose()
     print("Выключение")
 
 app = FastAPI(lifespan=lifespan)
+instrument_engines(engine, read_engine)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,10 +55,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(user_router, prefix="/api")
 app.include_router(places_router, prefix="/api")
+app.mount("/static/uploads", ContentAddressedStaticFiles(directory=UPLOAD_DIR), name="uploads")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 @app.get("/")
@@ -40,4 +70,27 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "database": "SQLite"}
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "database": "SQLite",
+        "hashing": hashing_pool.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "admission": get_admission_stats(),
+        "index_snapshot": index_snapshots.get_stats(),
+        "clusters": cluster_index.get_stats(),
+        "cache_sync": cache_sync.get_stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    gauges = {
+        "hashing": hashing_pool.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "geocoder": geocoder.get_stats(),
+        "index_snapshot": index_snapshots.get_stats(),
+        "clusters": cluster_index.get_stats(),
+        "cache_sync": cache_sync.get_stats(),
+    }
+    for name, stats in get_admission_stats().items():
+        gauges[f"admission_{name}"] = stats
+    return Response(render_metrics(gauges), media_type="text/plain; version=0.0.4; charset=utf-8")
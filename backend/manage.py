@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import sys
+
+from backend.migrations import check_schema, migrate, get_schema_version, LATEST_VERSION
+from backend.places_crud import PlaceCrud, ReviewCrud
+from backend.geocoder import geocoder
+from backend.geocoding_queue import geocoding_queue
+from backend.recommendations import rebuild_place_neighbors
+from backend.snapshots import SNAPSHOT_DIR, SNAPSHOT_KEEP, build_snapshot
+from backend.places_bulk import FORMATS, IMPORT_BATCH_SIZE, detect_format, import_places, export_places, export_reviews
+from backend.security import calibrate_hasher
+from backend.cache_sync import cache_sync
+
+async def run_migrations(args):
+    version = await get_schema_version()
+    if version >= (args.target or LATEST_VERSION):
+        print(f"Схема базы данных актуальна (версия {version})")
+        return
+    version = await migrate(args.target)
+    print(f"Версия схемы базы данных: {version}")
+
+async def rebuild_index(args):
+    await check_schema()
+    indexed = await PlaceCrud.rebuild_text_index(batch_size=args.batch_size)
+    print(f"Проиндексировано мест: {indexed}")
+    indexed = await PlaceCrud.rebuild_geohash_index(batch_size=args.batch_size)
+    print(f"Обновлено геохешей мест: {indexed}")
+
+async def reconcile_ratings(args):
+    await check_schema()
+    repaired = await ReviewCrud.reconcile_place_ratings()
+    print(f"Исправлено счётчиков отзывов: {repaired}")
+
+async def geocode_backfill(args):
+    await check_schema()
+    geocoding_queue.workers = args.workers
+    await geocoding_queue.start()
+    try:
+        await geocoding_queue.drain()
+        geocoded = await geocoding_queue.backfill(batch_size=args.batch_size)
+    finally:
+        await geocoding_queue.stop()
+        await geocoder.aclose()
+    print(f"Отправлено на геокодирование мест: {geocoded}")
+
+async def build_recommendations(args):
+    await check_schema()
+    count = await rebuild_place_neighbors()
+    if count is not None:
+        print(f"Сохранено пар похожих мест: {count}")
+
+async def build_index_snapshot(args):
+    await check_schema()
+    stats = await build_snapshot(args.directory, keep=args.keep)
+    print(
+        f"Опубликован снимок индекса v{stats['version']}: мест {stats['places']}, "
+        f"токенов {stats['tokens']}, вхождений {stats['postings']}"
+    )
+
+async def import_places_file(args):
+    await check_schema()
+    fmt = detect_format(args.path, args.format)
+    with open(args.path, encoding="utf-8-sig", newline="") as stream:
+        report = await import_places(stream, fmt, batch_size=args.batch_size)
+
+    print(f"Импортировано мест: {report.imported}, с ошибками: {report.failed}")
+    for error in report.errors:
+        print(f"  строка {error['line']}: {error['error']}")
+    if report.failed > len(report.errors):
+        print(f"  ... и ещё {report.failed - len(report.errors)}")
+
+    if args.geocode and report.geocoding_pending:
+        await geocoding_queue.start()
+        try:
+            await geocoding_queue.drain()
+        finally:
+            await geocoding_queue.stop()
+            await geocoder.aclose()
+        print(f"Геокодировано новых мест: {report.geocoding_pending}")
+    elif report.geocoding_pending:
+        print(f"Ожидают геокодирования: {report.geocoding_pending}")
+
+async def export_file(args):
+    await check_schema()
+    rows = export_places(args.format) if args.entity == "places" else export_reviews(args.format)
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        async for chunk in rows:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+async def calibrate_password_hasher(args):
+    params = calibrate_hasher(args.target_ms, max_memory_kib=args.max_memory_mib * 1024, parallelism=args.parallelism)
+    print(f"Хеширование занимает {params['elapsed_ms']} мс при параметрах:")
+    print(f"ARGON2_TIME_COST={params['time_cost']}")
+    print(f"ARGON2_MEMORY_COST={params['memory_cost']}")
+    print(f"ARGON2_PARALLELISM={params['parallelism']}")
+
+async def run_command(args):
+    try:
+        await args.handler(args)
+    finally:
+        # Running API workers drop whatever the command changed from their caches
+        await cache_sync.flush()
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m backend.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrations = commands.add_parser("migrate", help="Применить миграции схемы базы данных")
+    migrations.add_argument("--target", type=int, default=None)
+    migrations.set_defaults(handler=run_migrations)
+
+    rebuild = commands.add_parser("rebuild-index", help="Перестроить текстовые и геоиндексы мест")
+    rebuild.add_argument("--batch-size", type=int, default=500)
+    rebuild.set_defaults(handler=rebuild_index)
+
+    reconcile = commands.add_parser("reconcile-ratings", help="Пересчитать рейтинги и число отзывов мест")
+    reconcile.set_defaults(handler=reconcile_ratings)
+
+    backfill = commands.add_parser("geocode-backfill", help="Геокодировать места без координат")
+    backfill.add_argument("--batch-size", type=int, default=100)
+    backfill.add_argument("--workers", type=int, default=geocoding_queue.workers)
+    backfill.set_defaults(handler=geocode_backfill)
+
+    recommendations = commands.add_parser("build-recommendations", help="Пересчитать похожие места по избранному и отзывам")
+    recommendations.set_defaults(handler=build_recommendations)
+
+    snapshot = commands.add_parser("build-snapshot", help="Собрать снимок индексов для рабочих процессов")
+    snapshot.add_argument("--directory", default=SNAPSHOT_DIR)
+    snapshot.add_argument("--keep", type=int, default=SNAPSHOT_KEEP, help="Сколько версий хранить")
+    snapshot.set_defaults(handler=build_index_snapshot)
+
+    importer = commands.add_parser("import-places", help="Импортировать места из NDJSON или CSV")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=FORMATS, default=None)
+    importer.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    importer.add_argument("--geocode", action="store_true", help="Сразу геокодировать места без координат")
+    importer.set_defaults(handler=import_places_file)
+
+    exporter = commands.add_parser("export", help="Выгрузить места или отзывы в NDJSON или CSV")
+    exporter.add_argument("entity", choices=("places", "reviews"))
+    exporter.add_argument("--format", choices=FORMATS, default="ndjson")
+    exporter.add_argument("--output", "-o", default=None)
+    exporter.set_defaults(handler=export_file)
+
+    calibrate = commands.add_parser("calibrate-hasher", help="Подобрать параметры Argon2 под целевую задержку")
+    calibrate.add_argument("--target-ms", type=float, default=250.0)
+    calibrate.add_argument("--max-memory-mib", type=int, default=256)
+    calibrate.add_argument("--parallelism", type=int, default=4)
+    calibrate.set_defaults(handler=calibrate_password_hasher)
+
+    args = parser.parse_args()
+    asyncio.run(run_command(args))
+
+if __name__ == "__main__":
+    main()
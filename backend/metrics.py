@@ -0,0 +1,186 @@
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+SLOW_QUERY_LOG_LENGTH = 500
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        values = self._values or ({(): 0.0} if not self.labels else {})
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labels = labels
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][index] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (buckets, total, count) in sorted(self._values.items()):
+            for bound, bucket_count in zip(self.buckets, buckets):
+                bucket_labels = _format_labels(self.labels, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+            inf_labels = _format_labels(self.labels, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+@dataclass
+class RequestStats:
+    route: str = ""
+    queries: int = 0
+    sql_seconds: float = 0.0
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+requests_total = Counter(
+    "http_requests_total", "Количество HTTP-запросов", ("method", "route", "status")
+)
+request_duration = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", LATENCY_BUCKETS, ("method", "route")
+)
+request_queries = Histogram(
+    "http_request_sql_queries", "Число SQL-запросов на HTTP-запрос", QUERY_COUNT_BUCKETS, ("method", "route")
+)
+request_sql_duration = Histogram(
+    "http_request_sql_duration_seconds", "Время SQL-запросов на HTTP-запрос", LATENCY_BUCKETS, ("method", "route")
+)
+query_duration = Histogram(
+    "sql_query_duration_seconds", "Время выполнения SQL-запроса", LATENCY_BUCKETS
+)
+slow_queries_total = Counter(
+    "sql_slow_queries_total", "Количество медленных SQL-запросов"
+)
+admission_shed_total = Counter(
+    "admission_shed_total", "Количество запросов, отклонённых контролем нагрузки", ("policy", "reason")
+)
+
+REGISTRY = [
+    requests_total, request_duration, request_queries, request_sql_duration,
+    query_duration, slow_queries_total, admission_shed_total,
+]
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    query_duration.observe(elapsed)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = stats.route if stats else "-"
+        slow_queries_total.inc()
+        print(f"Медленный SQL-запрос {elapsed * 1000:.0f} мс [{route}]: {' '.join(statement.split())[:SLOW_QUERY_LOG_LENGTH]}")
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def instrument_engines(*engines):
+    for engine in {id(engine): engine for engine in engines}.values():
+        sync_engine = engine.sync_engine
+        if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+            continue
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(route=scope["path"])
+        token = _request_stats.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            elapsed = time.perf_counter() - started
+            # Label by route template so /places/1 and /places/2 share one series
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            requests_total.inc(method, route, str(status))
+            request_duration.observe(elapsed, method, route)
+            request_queries.observe(stats.queries, method, route)
+            request_sql_duration.observe(stats.sql_seconds, method, route)
+
+def _gauge_lines(prefix: str, values: dict) -> List[str]:
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return lines
+
+def render_metrics(gauges: Optional[Dict[str, dict]] = None) -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for prefix, values in (gauges or {}).items():
+        lines.extend(_gauge_lines(prefix, values))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,311 @@
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from backend.database import engine
+from backend.geo import encode_geohash
+from backend.tokenizer import extract_tokens, stem_words
+
+MIGRATION_BATCH_SIZE = 500
+
+RECOUNT_PLACE_RATINGS = (
+    "UPDATE places SET "
+    "review_count = (SELECT COUNT(*) FROM reviews WHERE reviews.place_id = places.id), "
+    "average_rating = (SELECT COALESCE(AVG(rating), 0) FROM reviews WHERE reviews.place_id = places.id)"
+)
+
+# Schema version 1 as it was released; later changes go into new migrations, never here
+INITIAL_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        username VARCHAR(50) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        first_name VARCHAR(100),
+        last_name VARCHAR(100),
+        is_active BOOLEAN NOT NULL,
+        is_superuser BOOLEAN NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        last_login DATETIME,
+        favorite_places JSON NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_users_username ON users (username)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    """CREATE TABLE IF NOT EXISTS places (
+        id INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        description TEXT NOT NULL,
+        address VARCHAR(200) NOT NULL,
+        city VARCHAR(50) NOT NULL,
+        contacts VARCHAR(200) NOT NULL,
+        photos JSON NOT NULL,
+        photo_variants JSON DEFAULT '[]' NOT NULL,
+        average_rating FLOAT DEFAULT '0' NOT NULL,
+        review_count INTEGER DEFAULT '0' NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        latitude FLOAT,
+        longitude FLOAT,
+        geohash VARCHAR(12),
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS reviews (
+        id INTEGER NOT NULL,
+        place_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        rating INTEGER NOT NULL,
+        comment TEXT NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(place_id) REFERENCES places (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_place_created ON reviews (place_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_place_rating ON reviews (place_id, rating)",
+    """CREATE TABLE IF NOT EXISTS favorites (
+        user_id INTEGER NOT NULL,
+        place_id INTEGER NOT NULL,
+        created_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id, place_id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(place_id) REFERENCES places (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_favorites_place_id ON favorites (place_id)",
+    """CREATE TABLE IF NOT EXISTS place_tokens (
+        place_id INTEGER NOT NULL,
+        token VARCHAR(64) NOT NULL,
+        PRIMARY KEY (place_id, token),
+        FOREIGN KEY(place_id) REFERENCES places (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_place_tokens_token ON place_tokens (token)",
+    """CREATE TABLE IF NOT EXISTS geocode_jobs (
+        place_id INTEGER NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        attempts INTEGER NOT NULL,
+        last_error TEXT,
+        next_attempt_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (place_id),
+        FOREIGN KEY(place_id) REFERENCES places (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_geocode_jobs_status ON geocode_jobs (status)",
+    """CREATE TABLE IF NOT EXISTS geocode_cache (
+        address_key VARCHAR(300) NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        created_at DATETIME NOT NULL,
+        PRIMARY KEY (address_key)
+    )""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS places_fts "
+    "USING fts5(name, description, address, city, tokenize='unicode61')",
+)
+
+# Columns the places table gained before migrations existed, in the order they were added
+LEGACY_PLACE_COLUMNS = (
+    ("review_count", "INTEGER DEFAULT '0' NOT NULL"),
+    ("geohash", "VARCHAR(12)"),
+    ("photo_variants", "JSON DEFAULT '[]' NOT NULL"),
+)
+
+def _initial_schema(sync_conn):
+    for statement in INITIAL_SCHEMA:
+        sync_conn.execute(text(statement))
+
+    # Databases created before migrations existed keep their older places table
+    existing = {row[1] for row in sync_conn.execute(text("PRAGMA table_info(places)"))}
+    for name, ddl in LEGACY_PLACE_COLUMNS:
+        if name not in existing:
+            sync_conn.execute(text(f"ALTER TABLE places ADD COLUMN {name} {ddl}"))
+    sync_conn.execute(text("CREATE INDEX IF NOT EXISTS ix_places_geohash ON places (geohash)"))
+    sync_conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_places_latitude_longitude ON places (latitude, longitude)"
+    ))
+
+    # Counters start at the column default, so existing reviews have to be counted right away
+    if "review_count" not in existing:
+        sync_conn.execute(text(RECOUNT_PLACE_RATINGS))
+
+def _index_place_city(sync_conn):
+    sync_conn.execute(text("CREATE INDEX IF NOT EXISTS ix_places_city ON places (city)"))
+
+def _unique_review_per_user(sync_conn):
+    duplicates = sync_conn.execute(text(
+        "DELETE FROM reviews WHERE id NOT IN "
+        "(SELECT MAX(id) FROM reviews GROUP BY place_id, user_id)"
+    )).rowcount
+    if duplicates:
+        print(f"Удалено повторных отзывов: {duplicates}")
+        sync_conn.execute(text(RECOUNT_PLACE_RATINGS))
+
+    sync_conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_reviews_place_user ON reviews (place_id, user_id)"
+    ))
+
+def _place_neighbors(sync_conn):
+    sync_conn.execute(text(
+        """CREATE TABLE IF NOT EXISTS place_neighbors (
+            place_id INTEGER NOT NULL,
+            neighbor_id INTEGER NOT NULL,
+            score FLOAT NOT NULL,
+            PRIMARY KEY (place_id, neighbor_id),
+            FOREIGN KEY(place_id) REFERENCES places (id),
+            FOREIGN KEY(neighbor_id) REFERENCES places (id)
+        )"""
+    ))
+    sync_conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_place_neighbors_neighbor_id ON place_neighbors (neighbor_id)"
+    ))
+
+def _native_place_photos(sync_conn):
+    # Photos used to be stored as a JSON string holding an encoded list
+    inner = "json_extract(photos, '$')"
+    fixed = sync_conn.execute(text(
+        f"UPDATE places SET photos = CASE "
+        f"WHEN json_valid({inner}) AND json_type({inner}) = 'array' THEN {inner} "
+        f"ELSE json_array({inner}) END "
+        "WHERE json_valid(photos) AND json_type(photos) = 'text'"
+    )).rowcount
+    sync_conn.execute(text(
+        "UPDATE places SET photos = '[]' WHERE photos IS NULL OR NOT json_valid(photos)"
+    ))
+    if fixed:
+        print(f"Исправлено записей с фотографиями: {fixed}")
+
+def _legacy_favorites(sync_conn):
+    # Favorites used to live in a JSON list on the user row
+    moved = sync_conn.execute(text(
+        "INSERT OR IGNORE INTO favorites (user_id, place_id, created_at) "
+        "SELECT users.id, favorite.value, datetime('now', 'localtime') "
+        "FROM users, json_each(users.favorite_places) AS favorite "
+        "WHERE json_valid(users.favorite_places) AND json_type(users.favorite_places) = 'array' "
+        "AND favorite.value IN (SELECT id FROM places)"
+    )).rowcount
+    sync_conn.execute(text(
+        "UPDATE users SET favorite_places = '[]' WHERE favorite_places IS NULL OR favorite_places != '[]'"
+    ))
+    if moved:
+        print(f"Перенесено избранных мест: {moved}")
+
+def _index_existing_places(sync_conn):
+    # Places written before the token, full-text and geohash indexes existed are indexed here
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = sync_conn.execute(text(
+            "SELECT id, name, description, address, city FROM places "
+            "WHERE id > :last_id AND NOT EXISTS (SELECT 1 FROM places_fts WHERE places_fts.rowid = places.id) "
+            "ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": MIGRATION_BATCH_SIZE}).all()
+        if not rows:
+            break
+
+        tokens = [
+            {"place_id": row.id, "token": token}
+            for row in rows
+            for token in extract_tokens(row.name + " " + row.description)
+        ]
+        if tokens:
+            sync_conn.execute(text(
+                "INSERT OR IGNORE INTO place_tokens (place_id, token) VALUES (:place_id, :token)"
+            ), tokens)
+        sync_conn.execute(text(
+            "INSERT INTO places_fts (rowid, name, description, address, city) "
+            "VALUES (:id, :name, :description, :address, :city)"
+        ), [
+            {
+                "id": row.id,
+                "name": " ".join(stem_words(row.name)),
+                "description": " ".join(stem_words(row.description)),
+                "address": " ".join(stem_words(row.address)),
+                "city": " ".join(stem_words(row.city)),
+            }
+            for row in rows
+        ])
+        indexed += len(rows)
+        last_id = rows[-1].id
+
+    rows = sync_conn.execute(text(
+        "SELECT id, latitude, longitude FROM places "
+        "WHERE geohash IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL"
+    )).all()
+    if rows:
+        sync_conn.execute(text("UPDATE places SET geohash = :geohash WHERE id = :id"), [
+            {"id": row.id, "geohash": encode_geohash(row.latitude, row.longitude)} for row in rows
+        ])
+    if indexed or rows:
+        print(f"Проиндексировано мест: {indexed}, обновлено геохешей: {len(rows)}")
+
+def _recount_place_ratings(sync_conn):
+    sync_conn.execute(text(RECOUNT_PLACE_RATINGS))
+
+def _worker_coordination(sync_conn):
+    sync_conn.execute(text(
+        """CREATE TABLE IF NOT EXISTS cache_invalidations (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            origin VARCHAR(50) NOT NULL,
+            cache VARCHAR(20) NOT NULL,
+            keys JSON,
+            created_at DATETIME NOT NULL
+        )"""
+    ))
+    sync_conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_cache_invalidations_created_at ON cache_invalidations (created_at)"
+    ))
+    sync_conn.execute(text(
+        """CREATE TABLE IF NOT EXISTS job_leases (
+            name VARCHAR(50) NOT NULL,
+            owner VARCHAR(50) NOT NULL,
+            expires_at DATETIME NOT NULL,
+            PRIMARY KEY (name)
+        )"""
+    ))
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "Начальная схема", _initial_schema),
+    (2, "Индекс по городу мест", _index_place_city),
+    (3, "Один отзыв пользователя на место", _unique_review_per_user),
+    (4, "Похожие места для рекомендаций", _place_neighbors),
+    (5, "Фотографии мест в виде JSON-массива", _native_place_photos),
+    (6, "Перенос избранного из профилей пользователей", _legacy_favorites),
+    (7, "Индексы поиска и геохеши существующих мест", _index_existing_places),
+    (8, "Пересчёт счётчиков отзывов", _recount_place_ratings),
+    (9, "Согласование кэшей и фоновых задач между процессами", _worker_coordination),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+class SchemaOutdated(Exception):
+    pass
+
+async def get_schema_version() -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(text("PRAGMA user_version"))).scalar()
+
+async def migrate(target: Optional[int] = None) -> int:
+    target = LATEST_VERSION if target is None else target
+    version = await get_schema_version()
+
+    for number, description, upgrade in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        async with engine.begin() as conn:
+            await conn.run_sync(upgrade)
+            await conn.execute(text(f"PRAGMA user_version = {number}"))
+        print(f"Применена миграция {number}: {description}")
+        version = number
+    return version
+
+async def check_schema():
+    version = await get_schema_version()
+    if version < LATEST_VERSION:
+        raise SchemaOutdated(
+            f"Схема базы данных устарела (версия {version}, требуется {LATEST_VERSION}). "
+            "Выполните: python -m backend.manage migrate"
+        )
+    if version > LATEST_VERSION:
+        raise SchemaOutdated(
+            f"Схема базы данных новее приложения (версия {version}, поддерживается {LATEST_VERSION})"
+        )
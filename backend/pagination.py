@@ -0,0 +1,24 @@
+import base64
+import binascii
+import json
+from typing import Any, List
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> List[Any]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Некорректный курсор")
+    if not isinstance(values, list) or not values:
+        raise ValueError("Некорректный курсор")
+    return values
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def is_id(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
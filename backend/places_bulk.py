@@ -0,0 +1,168 @@
+import asyncio
+import csv
+import io
+import json
+import os
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterator, List, Optional, TextIO, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from backend.database import read_session, Place, Review
+from backend.places_crud import PlaceCrud
+from backend.places_schemas import PlaceImport
+from backend.responses import dumps
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+MAX_REPORTED_ERRORS = 100
+FORMATS = ("ndjson", "csv")
+
+PLACE_EXPORT_FIELDS = [
+    "id", "name", "description", "address", "city", "contacts", "photos",
+    "latitude", "longitude", "average_rating", "review_count", "created_at",
+]
+REVIEW_EXPORT_FIELDS = ["id", "place_id", "user_id", "rating", "comment", "created_at"]
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    failed: int = 0
+    geocoding_pending: int = 0
+    errors: List[dict] = field(default_factory=list)
+
+    def add_error(self, line: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+def detect_format(filename: Optional[str], explicit: Optional[str] = None) -> str:
+    if explicit:
+        return explicit
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    if extension == "csv":
+        return "csv"
+    raise ValueError("Не удалось определить формат файла, укажите ndjson или csv")
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[Tuple[int, object]]:
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            yield number, line
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+def parse_row(raw) -> PlaceImport:
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Некорректный JSON: {e.msg}")
+        if not isinstance(raw, dict):
+            raise ValueError("Строка должна быть JSON-объектом")
+
+    # csv.DictReader collects values beyond the header under the None key
+    if None in raw:
+        raise ValueError("Лишние поля в строке")
+    row = {key: value for key, value in raw.items() if value not in ("", None)}
+    photos = row.get("photos")
+    if isinstance(photos, str):
+        row["photos"] = json.loads(photos) if photos.startswith("[") else [p for p in photos.split(";") if p]
+    return PlaceImport(**row)
+
+def read_batch(rows: Iterator[Tuple[int, object]], batch_size: int, report: ImportReport) -> Tuple[List[PlaceImport], bool]:
+    batch = []
+    seen = 0
+    for number, raw in rows:
+        seen += 1
+        try:
+            batch.append(parse_row(raw))
+        except ValidationError as e:
+            report.add_error(number, _format_validation_error(e))
+        except (ValueError, TypeError) as e:
+            report.add_error(number, str(e))
+        if seen >= batch_size:
+            return batch, False
+    return batch, True
+
+async def import_places(stream: TextIO, fmt: str, batch_size: int = IMPORT_BATCH_SIZE) -> ImportReport:
+    report = ImportReport()
+    rows = read_rows(stream, fmt)
+
+    finished = False
+    while not finished:
+        # Parsing and validation run off the event loop, one batch per transaction
+        batch, finished = await asyncio.to_thread(read_batch, rows, batch_size, report)
+        if not batch:
+            continue
+
+        places = await PlaceCrud.bulk_create_places(batch)
+        report.imported += len(places)
+        report.geocoding_pending += sum(
+            1 for place in places if place.latitude is None or place.longitude is None
+        )
+        print(f"Импортировано мест: {report.imported}")
+    return report
+
+def _csv_line(values: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+def _place_photos(place: Place) -> List[str]:
+    return [photo for photo in place.photos or [] if photo]
+
+async def _iter_batches(model, batch_size: int) -> AsyncIterator[list]:
+    last_id = 0
+    while True:
+        async with read_session() as session:
+            batch = list((await session.execute(
+                select(model).where(model.id > last_id).order_by(model.id).limit(batch_size)
+            )).scalars().all())
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+async def export_places(fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[str]:
+    if fmt == "csv":
+        yield _csv_line(PLACE_EXPORT_FIELDS)
+
+    async for places in _iter_batches(Place, batch_size):
+        chunk = []
+        for place in places:
+            row = {name: getattr(place, name) for name in PLACE_EXPORT_FIELDS}
+            row["photos"] = _place_photos(place)
+            row["created_at"] = place.created_at.isoformat() if place.created_at else None
+            if fmt == "csv":
+                row["photos"] = ";".join(row["photos"])
+                chunk.append(_csv_line([row[name] for name in PLACE_EXPORT_FIELDS]))
+            else:
+                chunk.append(dumps(row).decode("utf-8") + "\n")
+        yield "".join(chunk)
+
+async def export_reviews(fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[str]:
+    if fmt == "csv":
+        yield _csv_line(REVIEW_EXPORT_FIELDS)
+
+    async for reviews in _iter_batches(Review, batch_size):
+        chunk = []
+        for review in reviews:
+            row = {name: getattr(review, name) for name in REVIEW_EXPORT_FIELDS}
+            row["created_at"] = review.created_at.isoformat() if review.created_at else None
+            if fmt == "csv":
+                chunk.append(_csv_line([row[name] for name in REVIEW_EXPORT_FIELDS]))
+            else:
+                chunk.append(dumps(row).decode("utf-8") + "\n")
+        yield "".join(chunk)
@@ -1,39 +1,41 @@
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, delete, func, update, or_, text, insert
 from sqlalchemy.exc import IntegrityError
-from backend.database import new_session, User, Place, Review
-from backend.places_schemas import PlaceCreate, ReviewCreate
+from sqlalchemy.orm import load_only
+from backend.database import new_session, read_session, User, Place, PlaceToken, PlaceNeighbor, Favorite, Review, GeocodeJob
+from backend.places_schemas import PlaceCreate, PlaceImport, ReviewCreate
 from backend.geocoder import geocoder
-import json
-from typing import List, Optional, Dict
-import asyncio
-import re
+from backend.pagination import encode_cursor, decode_cursor, is_number, is_id
+from backend.response_cache import response_cache
+from backend.clusters import cluster_index
+from backend.tokenizer import stem_words, extract_tokens
+from backend.snapshots import index_snapshots
+from backend.geo import (
+    GEOHASH_PRECISION, encode_geohash, geohash_neighborhood,
+    covered_radius, precision_for_radius, haversine_m
+)
+from typing import List, Optional, Dict, Tuple, Set
 from collections import defaultdict, Counter
+import heapq
 import math
-from nltk.corpus import stopwords
-from nltk.stem.snowball import SnowballStemmer
+from datetime import datetime
 
 class PlaceCrud:
-    _stemmer = SnowballStemmer("russian")
-    _stop_words = set(stopwords.words("russian"))
+    SUMMARY_COLUMNS = (
+        Place.id, Place.name, Place.address, Place.city, Place.photos, Place.photo_variants,
+        Place.latitude, Place.longitude, Place.average_rating, Place.review_count,
+    )
 
     @classmethod
     async def create_place(cls, data: PlaceCreate, user_id: int) -> Place:
         async with new_session() as session:
             try:
-                place_dict = data.model_dump()
-                place_dict["photos"] = json.dumps(place_dict["photos"])
-                
-                coordinates = await geocoder.geocode_address(data.city, data.address)
-                if coordinates:
-                    place_dict["latitude"] = float(coordinates[0])
-                    place_dict["longitude"] = float(coordinates[1])
-                    print(f"Координаты {data.name}: {place_dict['latitude']}, {place_dict['longitude']}")
-                else:
-                    print(f"Не удалось получить координаты для: {data.name}")
-                
-                place = Place(**place_dict)
+                place = Place(**data.model_dump())
                 session.add(place)
+                await session.flush()
+                await cls._index_place(session, place)
+                session.add(GeocodeJob(place_id=place.id))
                 await session.commit()
+                response_cache.invalidate("cities")
                 await session.refresh(place)
                 return place
             except Exception as e:
@@ -41,99 +43,506 @@ class PlaceCrud:
                 raise e
     
     @classmethod
-    async def get_place_by_id(cls, place_id: int) -> Place | None:
+    async def bulk_create_places(cls, items: List[PlaceImport]) -> List[Place]:
         async with new_session() as session:
+            try:
+                places = []
+                for item in items:
+                    place_dict = item.model_dump()
+                    place_dict["geohash"] = cls._geohash(item.latitude, item.longitude)
+                    places.append(Place(**place_dict))
+                session.add_all(places)
+                await session.flush()
+
+                await cls._index_new_places(session, places)
+                session.add_all(
+                    GeocodeJob(place_id=place.id)
+                    for place in places
+                    if place.latitude is None or place.longitude is None
+                )
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                raise e
+        response_cache.invalidate("cities")
+        cluster_index.invalidate(*(place.geohash for place in places))
+        return places
+
+    @classmethod
+    async def set_photo_variants(cls, place_id: int, variants: List[Dict[str, str]]):
+        async with new_session() as session:
+            await session.execute(
+                update(Place).where(Place.id == place_id).values(photo_variants=variants)
+            )
+            await session.commit()
+        response_cache.invalidate(("place", place_id))
+
+    @staticmethod
+    def _geohash(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+        if latitude is None or longitude is None:
+            return None
+        return encode_geohash(latitude, longitude)
+
+    @classmethod
+    async def set_place_coordinates(cls, place_id: int, latitude: Optional[float], longitude: Optional[float]) -> bool:
+        geohash = cls._geohash(latitude, longitude)
+        async with new_session() as session:
+            previous = await session.scalar(select(Place.geohash).where(Place.id == place_id))
+            result = await session.execute(
+                update(Place)
+                .where(Place.id == place_id)
+                .values(latitude=latitude, longitude=longitude, geohash=geohash)
+            )
+            await session.commit()
+        response_cache.invalidate(("place", place_id))
+        cluster_index.invalidate(previous, geohash)
+        return result.rowcount > 0
+
+    @classmethod
+    async def update_place_coordinates(cls, place_id: int, raise_errors: bool = False) -> Optional[List[float]]:
+        place = await cls.get_place_by_id(place_id)
+        if not place:
+            return None
+
+        coordinates = await geocoder.geocode_address(place.city, place.address, raise_errors=raise_errors)
+        if coordinates:
+            await cls.set_place_coordinates(place_id, float(coordinates[0]), float(coordinates[1]))
+            print(f"Координаты {place.name}: {coordinates[0]}, {coordinates[1]}")
+        else:
+            print(f"Не удалось получить координаты для: {place.name}")
+        return coordinates
+
+    @classmethod
+    async def get_place_by_id(cls, place_id: int) -> Place | None:
+        async with read_session() as session:
             query = select(Place).where(Place.id == place_id)
             result = await session.execute(query)
             return result.scalar_one_or_none()
     
     @classmethod
-    def _extract_tokens(cls, text: str) -> List[str]:
-        text = text.lower()
+    async def _index_place(cls, session, place: Place):
+        await session.execute(delete(PlaceToken).where(PlaceToken.place_id == place.id))
+        tokens = extract_tokens(place.name + " " + place.description)
+        session.add_all(PlaceToken(place_id=place.id, token=token) for token in tokens)
 
-        words = re.findall(r"[а-яёa-z]{3,}", text)
+        await session.execute(text("DELETE FROM places_fts WHERE rowid = :id"), {"id": place.id})
+        await session.execute(
+            text(
+                "INSERT INTO places_fts (rowid, name, description, address, city) "
+                "VALUES (:id, :name, :description, :address, :city)"
+            ),
+            {
+                "id": place.id,
+                "name": " ".join(stem_words(place.name)),
+                "description": " ".join(stem_words(place.description)),
+                "address": " ".join(stem_words(place.address)),
+                "city": " ".join(stem_words(place.city)),
+            }
+        )
 
+    @classmethod
+    async def _index_new_places(cls, session, places: List[Place]):
+        if not places:
+            return
         tokens = [
-            cls._stemmer.stem(word)
-            for word in words
-            if word not in cls._stop_words
+            {"place_id": place.id, "token": token}
+            for place in places
+            for token in extract_tokens(place.name + " " + place.description)
         ]
+        if tokens:
+            await session.execute(insert(PlaceToken), tokens)
+        await session.execute(
+            text(
+                "INSERT INTO places_fts (rowid, name, description, address, city) "
+                "VALUES (:id, :name, :description, :address, :city)"
+            ),
+            [
+                {
+                    "id": place.id,
+                    "name": " ".join(stem_words(place.name)),
+                    "description": " ".join(stem_words(place.description)),
+                    "address": " ".join(stem_words(place.address)),
+                    "city": " ".join(stem_words(place.city)),
+                }
+                for place in places
+            ]
+        )
+
+    @classmethod
+    async def rebuild_text_index(cls, batch_size: int = 500) -> int:
+        indexed = 0
+        last_id = 0
+        async with new_session() as session:
+            while True:
+                query = (
+                    select(Place)
+                    .options(load_only(Place.id, Place.name, Place.description, Place.address, Place.city))
+                    .where(Place.id > last_id)
+                    .order_by(Place.id)
+                    .limit(batch_size)
+                )
+                batch = list((await session.execute(query)).scalars().all())
+                if not batch:
+                    break
 
-        return list(set(tokens))
+                for place in batch:
+                    await cls._index_place(session, place)
+                await session.commit()
+
+                indexed += len(batch)
+                last_id = batch[-1].id
+        return indexed
     
     @classmethod
-    async def get_all_places(
-        cls,
-        city: Optional[str] = None,
-        user: Optional[User] = None
-    ) -> List[Place]:
+    async def rebuild_geohash_index(cls, batch_size: int = 500) -> int:
+        indexed = 0
+        last_id = 0
         async with new_session() as session:
+            while True:
+                rows = (await session.execute(
+                    select(Place.id, Place.latitude, Place.longitude)
+                    .where(Place.id > last_id)
+                    .order_by(Place.id)
+                    .limit(batch_size)
+                )).all()
+                if not rows:
+                    break
+
+                for place_id, latitude, longitude in rows:
+                    await session.execute(
+                        update(Place)
+                        .where(Place.id == place_id)
+                        .values(geohash=cls._geohash(latitude, longitude))
+                    )
+                await session.commit()
+
+                indexed += len(rows)
+                last_id = rows[-1][0]
+        cluster_index.clear()
+        return indexed
+
+    @classmethod
+    async def _places_near(cls, session, latitude: float, longitude: float,
+                           precision: int, city: Optional[str]) -> List[Tuple[Place, float]]:
+        cells = geohash_neighborhood(encode_geohash(latitude, longitude, precision))
+        query = (
+            select(Place)
+            .options(load_only(*cls.SUMMARY_COLUMNS))
+            .where(or_(*[
+                and_(Place.geohash >= cell, Place.geohash < cell + "{")
+                for cell in cells
+            ]))
+        )
+        if city:
+            query = query.where(Place.city == city)
+
+        places = (await session.execute(query)).scalars().all()
+        return [
+            (place, haversine_m(latitude, longitude, place.latitude, place.longitude))
+            for place in places
+        ]
+
+    @classmethod
+    async def get_nearby_places(
+        cls,
+        latitude: float,
+        longitude: float,
+        radius: Optional[float] = None,
+        limit: int = 20,
+        city: Optional[str] = None
+    ) -> List[Tuple[Place, float]]:
+        async with read_session() as session:
+            if radius is not None:
+                precision = precision_for_radius(latitude, radius)
+                candidates = await cls._places_near(session, latitude, longitude, precision, city)
+                matches = sorted(
+                    (item for item in candidates if item[1] <= radius),
+                    key=lambda item: (item[1], item[0].id)
+                )
+                return matches[:limit]
+
+            for precision in range(GEOHASH_PRECISION - 2, 0, -1):
+                candidates = await cls._places_near(session, latitude, longitude, precision, city)
+                reach = covered_radius(latitude, precision)
+                matches = [item for item in candidates if item[1] <= reach]
+                if len(matches) >= limit:
+                    matches.sort(key=lambda item: (item[1], item[0].id))
+                    return matches[:limit]
+            # Fewer than limit places within the widest neighborhood, so the rest of the globe is scanned
+            return await cls._nearest_places(session, latitude, longitude, limit, city)
+
+    @classmethod
+    async def _nearest_places(cls, session, latitude: float, longitude: float,
+                              limit: int, city: Optional[str]) -> List[Tuple[Place, float]]:
+        query = select(Place.id, Place.latitude, Place.longitude).where(Place.geohash.is_not(None))
+        if city:
+            query = query.where(Place.city == city)
+
+        nearest = heapq.nsmallest(limit, (
+            (haversine_m(latitude, longitude, place_latitude, place_longitude), place_id)
+            for place_id, place_latitude, place_longitude in (await session.execute(query)).all()
+        ))
+        places = await cls._load_places(
+            session, [place_id for _, place_id in nearest], [load_only(*cls.SUMMARY_COLUMNS)]
+        )
+        return [(places[place_id], distance) for distance, place_id in nearest if place_id in places]
 
-            query = select(Place)
+    @classmethod
+    async def get_places_in_bbox(
+        cls,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        limit: Optional[int] = None,
+        city: Optional[str] = None
+    ) -> List[Place]:
+        async with read_session() as session:
+            query = (
+                select(Place)
+                .options(load_only(*cls.SUMMARY_COLUMNS))
+                .where(
+                    Place.latitude.between(min_lat, max_lat),
+                    Place.longitude.between(min_lon, max_lon)
+                )
+                .order_by(Place.average_rating.desc(), Place.id)
+            )
             if city:
                 query = query.where(Place.city == city)
+            if limit is not None:
+                query = query.limit(limit)
+            return list((await session.execute(query)).scalars().all())
 
-            all_places = list((await session.execute(query)).scalars().all())
+    @classmethod
+    async def _recommendation_weights(cls, session, favorite_ids: Set[int]) -> Dict[str, float]:
+        if not favorite_ids:
+            return {}
 
-            if not user.favorite_places:
-                return sorted(all_places, key=lambda p: p.average_rating, reverse=True)
+        total_favorites = (await session.execute(
+            select(func.count()).select_from(Place).where(Place.id.in_(favorite_ids))
+        )).scalar_one()
 
-            favorite_places = list((await session.execute(
-                select(Place).where(Place.id.in_(user.favorite_places))
-            )).scalars().all())
+        if not total_favorites:
+            return {}
 
-            if not favorite_places:
-                return sorted(all_places, key=lambda p: p.average_rating, reverse=True)
+        favorite_tokens = (await session.execute(
+            select(PlaceToken.token).where(PlaceToken.place_id.in_(favorite_ids))
+        )).scalars().all()
 
-            favorite_tokens = []
-            for place in favorite_places:
-                favorite_tokens.extend(
-                    cls._extract_tokens(place.name + " " + place.description)
-                )
+        tf = Counter(favorite_tokens)
 
-            if not favorite_tokens:
-                return sorted(all_places, key=lambda p: p.average_rating, reverse=True)
+        idf = {
+            token: math.log(total_favorites / freq)
+            for token, freq in tf.items()
+        }
+        return {token: tf[token] * idf[token] for token in idf if idf[token] > 0}
 
-            tf = Counter(favorite_tokens)
-            total_favorites = len(favorite_places)
+    @classmethod
+    async def _neighbor_scores(cls, session, favorite_ids: Set[int], city: Optional[str]) -> Dict[int, float]:
+        if not favorite_ids:
+            return {}
 
-            idf = {
-                token: math.log(total_favorites / freq)
-                for token, freq in tf.items()
-            }
+        query = select(PlaceNeighbor.neighbor_id, func.sum(PlaceNeighbor.score)).where(
+            PlaceNeighbor.place_id.in_(favorite_ids),
+            PlaceNeighbor.neighbor_id.not_in(favorite_ids)
+        )
+        if city:
+            query = query.join(Place, Place.id == PlaceNeighbor.neighbor_id).where(Place.city == city)
+        query = query.group_by(PlaceNeighbor.neighbor_id)
+        return dict((await session.execute(query)).all())
 
-            scored_places = []
+    @classmethod
+    def _snapshot_token_scores(cls, snapshot, weights: Dict[str, float], favorite_ids: Set[int],
+                               city: Optional[str], scores: Dict[int, float]):
+        city_code = snapshot.city_code(city) if city else None
+        if city and city_code is None:
+            return
 
-            for place in all_places:
-                if place.id in user.favorite_places:
-                    continue
+        candidates = defaultdict(float)
+        for token, weight in weights.items():
+            for place_id in snapshot.postings(token):
+                candidates[place_id] += weight
 
-                tokens = cls._extract_tokens(place.name + " " + place.description)
+        for place_id, score in candidates.items():
+            if place_id in favorite_ids:
+                continue
+            # Tokens of a place deleted while the snapshot was built have no place row
+            position = snapshot.position(place_id)
+            if position is None:
+                continue
+            if city_code is not None and snapshot.city_codes[position] != city_code:
+                continue
+            scores[place_id] += score
 
-                score = sum(
-                    tf[token] * idf[token]
-                    for token in tokens
-                    if token in idf
-                )
+    @classmethod
+    async def _token_scores(cls, session, weights: Dict[str, float], favorite_ids: Set[int], city: Optional[str]) -> Dict[int, float]:
+        postings_query = (
+            select(PlaceToken.place_id, PlaceToken.token)
+            .join(Place, Place.id == PlaceToken.place_id)
+            .where(PlaceToken.token.in_(weights))
+        )
+        if city:
+            postings_query = postings_query.where(Place.city == city)
 
-                if score > 0:
-                    scored_places.append((place, score))
+        scores = defaultdict(float)
+        snapshot = index_snapshots.current()
+        if snapshot is not None:
+            # Postings come from the shared snapshot, only newer places are read from the database
+            cls._snapshot_token_scores(snapshot, weights, favorite_ids, city, scores)
+            postings_query = postings_query.where(PlaceToken.place_id > snapshot.max_place_id)
 
-            scored_places.sort(key=lambda x: x[1], reverse=True)
+        for place_id, token in await session.execute(postings_query):
+            if place_id not in favorite_ids:
+                scores[place_id] += weights[token]
+        return scores
 
-            recommended = [p for p, _ in scored_places]
+    @classmethod
+    async def _load_places(cls, session, place_ids: List[int], options) -> Dict[int, Place]:
+        places = {}
+        for start in range(0, len(place_ids), 500):
+            chunk = place_ids[start:start + 500]
+            query = select(Place).options(*options).where(Place.id.in_(chunk))
+            for place in (await session.execute(query)).scalars():
+                places[place.id] = place
+        return places
 
-            others = [
-                p for p in all_places
-                if p.id not in {pl.id for pl in recommended}
-            ]
-            others.sort(key=lambda p: p.average_rating, reverse=True)
+    @classmethod
+    async def get_all_places(
+        cls,
+        city: Optional[str] = None,
+        user: Optional[User] = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        summary: bool = False
+    ) -> Tuple[List[Place], Optional[str]]:
+        cursor = decode_cursor(after) if after else None
+        if cursor and not (
+            len(cursor) == 3 and cursor[0] in ("r", "o") and is_number(cursor[1]) and is_id(cursor[2])
+        ):
+            raise ValueError("Некорректный курсор")
+
+        options = [load_only(*cls.SUMMARY_COLUMNS)] if summary else []
+        async with read_session() as session:
+            favorite_ids = set()
+            if user:
+                favorite_ids = set((await session.execute(
+                    select(Favorite.place_id).where(Favorite.user_id == user.id)
+                )).scalars().all())
+
+            # Precomputed neighbors of favorites first, token overlap when there are none yet
+            scores = await cls._neighbor_scores(session, favorite_ids, city)
+            if not scores:
+                weights = await cls._recommendation_weights(session, favorite_ids)
+                if weights:
+                    scores = await cls._token_scores(session, weights, favorite_ids, city)
+
+            page = []
+            last_key = None
+            has_more = False
+
+            if scores and (cursor is None or cursor[0] == "r"):
+                ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+                if cursor:
+                    _, last_score, last_id = cursor
+                    ranked = [
+                        (place_id, score) for place_id, score in ranked
+                        if (-score, place_id) > (-last_score, last_id)
+                    ]
+                if limit is not None and len(ranked) > limit:
+                    ranked = ranked[:limit]
+                    has_more = True
+
+                places = await cls._load_places(session, [place_id for place_id, _ in ranked], options)
+                for place_id, score in ranked:
+                    if place_id in places:
+                        page.append(places[place_id])
+                        last_key = ("r", score, place_id)
+
+            if not has_more:
+                query = select(Place.id)
+                if city:
+                    query = query.where(Place.city == city)
+                if cursor and cursor[0] == "o":
+                    _, last_rating, last_id = cursor
+                    query = query.where(or_(
+                        Place.average_rating < last_rating,
+                        and_(Place.average_rating == last_rating, Place.id > last_id)
+                    ))
+                query = query.order_by(Place.average_rating.desc(), Place.id)
+
+                remaining = None if limit is None else limit - len(page)
+                if remaining is not None:
+                    # At most every scored place is skipped below, so this still leaves remaining + 1 rows
+                    query = query.limit(remaining + 1 + len(scores))
+
+                # Scored places were ranked above, so the same scores decide what is left for this phase
+                other_ids = [
+                    place_id for place_id in (await session.execute(query)).scalars()
+                    if place_id not in scores
+                ]
+                if remaining is not None and len(other_ids) > remaining:
+                    other_ids = other_ids[:remaining]
+                    has_more = True
 
-            return recommended + others
+                places = await cls._load_places(session, other_ids, options)
+                others = [places[place_id] for place_id in other_ids if place_id in places]
+
+                page.extend(others)
+                if others:
+                    last_key = ("o", others[-1].average_rating, others[-1].id)
+
+            next_cursor = encode_cursor(*last_key) if has_more and last_key else None
+            return page, next_cursor
+
+    @classmethod
+    async def search_places(
+        cls,
+        q: str,
+        city: Optional[str] = None,
+        limit: int = 20,
+        after: Optional[str] = None
+    ) -> Tuple[List[Place], Optional[str]]:
+        tokens = list(dict.fromkeys(stem_words(q)))
+        if not tokens:
+            return [], None
+
+        cursor = decode_cursor(after) if after else None
+        if cursor and not (len(cursor) == 2 and is_number(cursor[0]) and is_id(cursor[1])):
+            raise ValueError("Некорректный курсор")
+
+        params = {"match": " ".join(f'"{token}"' for token in tokens), "limit": limit + 1}
+        sql = (
+            "SELECT id, score FROM ("
+            "SELECT places_fts.rowid AS id, bm25(places_fts) AS score FROM places_fts "
+            "WHERE places_fts MATCH :match"
+            ") AS hits"
+        )
+        conditions = []
+        if city:
+            conditions.append("EXISTS (SELECT 1 FROM places WHERE places.id = hits.id AND places.city = :city)")
+            params["city"] = city
+        if cursor:
+            conditions.append("(score > :score OR (score = :score AND id > :id))")
+            params["score"], params["id"] = cursor
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY score, id LIMIT :limit"
+
+        async with read_session() as session:
+            hits = (await session.execute(text(sql), params)).all()
+            next_cursor = None
+            if len(hits) > limit:
+                hits = hits[:limit]
+                next_cursor = encode_cursor(hits[-1].score, hits[-1].id)
+
+            places = await cls._load_places(
+                session, [hit.id for hit in hits], [load_only(*cls.SUMMARY_COLUMNS)]
+            )
+            return [places[hit.id] for hit in hits if hit.id in places], next_cursor
 
     @classmethod
     async def get_cities(cls) -> List[str]:
-        async with new_session() as session:
+        async with read_session() as session:
             query = select(Place.city).distinct()
             result = await session.execute(query)
             return [row[0] for row in result.all()]
@@ -143,26 +552,100 @@ class ReviewCrud:
     async def create_review(cls, data: ReviewCreate, user_id: int) -> Review:
         async with new_session() as session:
             try:
-                existing_review = await session.execute(
-                    select(Review).where(
-                        and_(Review.place_id == data.place_id, Review.user_id == user_id)
-                    )
-                )
-                if existing_review.scalar_one_or_none():
-                    raise ValueError("Вы уже оставили отзыв для этого места")
-
                 review = Review(**data.model_dump(), user_id=user_id)
                 session.add(review)
+                await session.flush()
+                await session.execute(
+                    update(Place)
+                    .where(Place.id == data.place_id)
+                    .values(
+                        average_rating=(Place.average_rating * Place.review_count + data.rating)
+                        / (Place.review_count + 1),
+                        review_count=Place.review_count + 1,
+                    )
+                )
                 await session.commit()
+                response_cache.invalidate(("place", data.place_id), ("reviews", data.place_id))
                 await session.refresh(review)
                 return review
+            except IntegrityError:
+                await session.rollback()
+                raise ValueError("Вы уже оставили отзыв для этого места")
             except Exception as e:
                 await session.rollback()
                 raise e
 
     @classmethod
-    async def get_reviews_by_place(cls, place_id: int) -> List[Review]:
+    async def get_reviews_by_place(
+        cls,
+        place_id: int,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        sort: str = "newest"
+    ) -> Tuple[List[Tuple[Review, Optional[str]]], Optional[str]]:
+        sort_column = Review.created_at if sort == "newest" else Review.rating
+        query = (
+            select(Review, User.username)
+            .outerjoin(User, User.id == Review.user_id)
+            .where(Review.place_id == place_id)
+            .order_by(sort_column.desc(), Review.id.desc())
+        )
+
+        if after:
+            cursor = decode_cursor(after)
+            if len(cursor) != 2 or not is_id(cursor[1]):
+                raise ValueError("Некорректный курсор")
+            last_value, last_id = cursor
+            if sort == "newest":
+                if not isinstance(last_value, str):
+                    raise ValueError("Некорректный курсор")
+                try:
+                    last_value = datetime.fromisoformat(last_value)
+                except ValueError:
+                    raise ValueError("Некорректный курсор")
+            elif not is_number(last_value):
+                raise ValueError("Некорректный курсор")
+            query = query.where(or_(
+                sort_column < last_value,
+                and_(sort_column == last_value, Review.id < last_id)
+            ))
+
+        if limit is not None:
+            query = query.limit(limit + 1)
+
+        async with read_session() as session:
+            rows = [tuple(row) for row in (await session.execute(query)).all()]
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1][0]
+            last_value = last.created_at.isoformat() if sort == "newest" else last.rating
+            next_cursor = encode_cursor(last_value, last.id)
+        return rows, next_cursor
+
+    @classmethod
+    async def reconcile_place_ratings(cls) -> int:
+        review_count = (
+            select(func.count(Review.id))
+            .where(Review.place_id == Place.id)
+            .scalar_subquery()
+        )
+        average_rating = (
+            select(func.coalesce(func.avg(Review.rating), 0.0))
+            .where(Review.place_id == Place.id)
+            .scalar_subquery()
+        )
         async with new_session() as session:
-            query = select(Review).where(Review.place_id == place_id)
-            result = await session.execute(query)
-            return result.scalars().all()
\ No newline at end of file
+            result = await session.execute(
+                update(Place)
+                .where(or_(
+                    Place.review_count != review_count,
+                    func.abs(Place.average_rating - average_rating) > 1e-9,
+                ))
+                .values(review_count=review_count, average_rating=average_rating)
+            )
+            await session.commit()
+        response_cache.clear()
+        cluster_index.clear()
+        return result.rowcount
@@ -1,40 +1,51 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, Form
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, Form, Request, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Literal, Union, Tuple
+import io
 import os
+import hashlib
 import uuid
-import json
 import asyncio
 
 from backend.places_crud import PlaceCrud, ReviewCrud
 from backend.users_crud import UserCrud
-from backend.places_schemas import PlaceCreate, PlaceRead, ReviewCreate, ReviewRead, CityList
-from backend.dependencies import get_current_user
-from backend.database import User, new_session
+from backend.places_schemas import (
+    PlaceCreate, PlaceRead, PlaceSummary, NearbyPlace, ReviewCreate, ReviewRead, CityList, PlaceImportResult,
+    MapClusters, PlaceCoordinates
+)
+from backend.dependencies import get_current_user, get_current_superuser
+from backend.database import User
 from backend.geocoder import geocoder
+from backend.geocoding_queue import geocoding_queue
+from backend.images import generate_photo_variants
+from backend.response_cache import response_cache
+from backend.responses import FastJSONResponse, json_array_response
+from backend.clusters import cluster_index, MAX_ZOOM
+from backend.places_bulk import detect_format, import_places, export_places, export_reviews
+from backend.admission import AdmissionPolicy
 
 places_router = APIRouter(prefix="/places", tags=["places"])
 UPLOAD_DIR = "static/uploads"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 10 * 1024 * 1024))
+MAX_PAGE_SIZE = 200
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def serialize_place(place) -> dict:
-    photos = []
-    
-    try:
-        if place.photos:
-            if isinstance(place.photos, str):
-                parsed = json.loads(place.photos)
-                if isinstance(parsed, list):
-                    photos = parsed
-                else:
-                    photos = [parsed]
-            elif isinstance(place.photos, list):
-                photos = place.photos
-    except (json.JSONDecodeError, TypeError) as e:
-        print(f"Error parsing photos for place {place.id}: {e}")
-        photos = []
-    
-    photos = [photo for photo in photos if photo]
+# Geocoding, file writes and ranking are expensive, so these routes get their own budget
+create_place_admission = AdmissionPolicy(
+    "places_create", concurrency=4, max_queue=8, queue_timeout=5.0, rate=0.2, burst=10, key="user"
+)
+list_places_admission = AdmissionPolicy(
+    "places_list", concurrency=8, max_queue=32, queue_timeout=2.0, rate=5, burst=20, key="user"
+)
+import_places_admission = AdmissionPolicy(
+    "places_import", concurrency=1, rate=1 / 60, burst=3, key="user"
+)
+
+def parse_photos(place) -> List[str]:
+    return [photo for photo in place.photos or [] if photo]
 
+def serialize_place(place) -> dict:
     return {
         "id": place.id,
         "name": place.name,
@@ -42,33 +53,94 @@ def serialize_place(place) -> dict:
         "address": place.address,
         "city": place.city,
         "contacts": place.contacts,
-        "photos": photos,
+        "photos": parse_photos(place),
+        "photo_variants": place.photo_variants or [],
         "latitude": place.latitude,
         "longitude": place.longitude,
         "average_rating": place.average_rating,
-        "review_count": 0,
+        "review_count": place.review_count,
         "created_at": place.created_at,
         "updated_at": place.updated_at
     }
 
+def serialize_place_summary(place) -> dict:
+    return {
+        "id": place.id,
+        "name": place.name,
+        "address": place.address,
+        "city": place.city,
+        "photos": parse_photos(place),
+        "photo_variants": place.photo_variants or [],
+        "latitude": place.latitude,
+        "longitude": place.longitude,
+        "average_rating": place.average_rating,
+        "review_count": place.review_count
+    }
+
+def cursor_headers(next_cursor: Optional[str]) -> dict:
+    return {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+def remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def store_upload(temp_path: str, final_path: str) -> bool:
+    if os.path.exists(final_path):
+        os.remove(temp_path)
+        return False
+    os.replace(temp_path, final_path)
+    return True
+
+async def save_uploaded_file(file: UploadFile) -> Tuple[str, bool]:
+    file_extension = file.filename.split('.')[-1].lower() if '.' in file.filename else 'jpg'
+    if not file_extension.isalnum():
+        file_extension = 'jpg'
+    temp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4()}")
+
+    size = 0
+    digest = hashlib.sha256()
+    f = await asyncio.to_thread(open, temp_path, "wb")
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_UPLOAD_SIZE:
+                raise ValueError(
+                    f"Файл {file.filename} больше {MAX_UPLOAD_SIZE // (1024 * 1024)} МБ"
+                )
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(remove_files, [temp_path])
+        raise
+    await asyncio.to_thread(f.close)
+
+    file_path = os.path.join(UPLOAD_DIR, f"{digest.hexdigest()}.{file_extension}")
+    created = await asyncio.to_thread(store_upload, temp_path, file_path)
+    return file_path, created
+
 async def save_uploaded_files(files: List[UploadFile]) -> List[str]:
     photo_urls = []
+    created_files = []
     
-    for file in files:
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-        filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        photo_urls.append(file_path)
+    try:
+        for file in files:
+            file_path, created = await save_uploaded_file(file)
+            photo_urls.append(file_path)
+            if created:
+                created_files.append(file_path)
+    except BaseException:
+        await asyncio.to_thread(remove_files, created_files)
+        raise
     
     return photo_urls
 
-@places_router.post("/", response_model=PlaceRead)
+@places_router.post("/", response_model=PlaceRead, dependencies=[Depends(create_place_admission)])
 async def create_place(
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     description: str = Form(...),
     address: str = Form(...),
@@ -90,48 +162,149 @@ async def create_place(
         )
         
         place = await PlaceCrud.create_place(place_data, current_user.id)
+        geocoding_queue.submit(place.id)
+        background_tasks.add_task(generate_photo_variants, place.id, photo_urls)
         return serialize_place(place)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@places_router.get("/", response_model=List[PlaceRead])
+@places_router.get(
+    "/", response_model=List[Union[PlaceRead, PlaceSummary]], dependencies=[Depends(list_places_admission)]
+)
 async def get_places(city: Optional[str] = Query(None),
+                     limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                     after: Optional[str] = Query(None),
+                     fields: Literal["full", "summary"] = Query("full"),
                      current_user: User = Depends(get_current_user)):
-    places = await PlaceCrud.get_all_places(city=city, user=current_user)
-    result = []
-    for place in places:
-        place_data = serialize_place(place)
-        reviews = await ReviewCrud.get_reviews_by_place(place.id)
-        place_data["review_count"] = len(reviews)
-        place_data["average_rating"] = 0
-        for rev in reviews:
-            place_data["average_rating"] += rev.rating
-        if len(reviews):
-            place_data["average_rating"] /= len(reviews)
-        result.append(place_data)
-    return result
+    try:
+        places, next_cursor = await PlaceCrud.get_all_places(
+            city=city,
+            user=current_user,
+            limit=limit,
+            after=after,
+            summary=fields == "summary"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    favorites = await UserCrud.get_favorite_statuses(current_user.id, [place.id for place in places])
+    serialize = serialize_place_summary if fields == "summary" else serialize_place
+    return json_array_response(
+        places,
+        lambda place: {**serialize(place), "is_favorite": place.id in favorites},
+        headers=cursor_headers(next_cursor)
+    )
 
 @places_router.get("/cities", response_model=CityList)
-async def get_cities():
-    cities = await PlaceCrud.get_cities()
-    return {"cities": cities}
+async def get_cities(request: Request):
+    async def load():
+        cities = await PlaceCrud.get_cities()
+        return CityList(cities=cities), {}
+
+    return await response_cache.respond(request, "cities", (), load)
+
+@places_router.get("/search", response_model=List[PlaceSummary])
+async def search_places(q: str = Query(..., min_length=1, max_length=200),
+                        city: Optional[str] = Query(None),
+                        limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                        after: Optional[str] = Query(None)):
+    try:
+        places, next_cursor = await PlaceCrud.search_places(q, city=city, limit=limit, after=after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return json_array_response(places, serialize_place_summary, headers=cursor_headers(next_cursor))
+
+@places_router.get("/nearby", response_model=List[NearbyPlace])
+async def get_nearby_places(lat: float = Query(..., ge=-90, le=90),
+                            lon: float = Query(..., ge=-180, le=180),
+                            radius: Optional[float] = Query(None, gt=0, le=50000),
+                            limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                            city: Optional[str] = Query(None)):
+    places = await PlaceCrud.get_nearby_places(lat, lon, radius=radius, limit=limit, city=city)
+    return json_array_response(
+        places,
+        lambda item: {**serialize_place_summary(item[0]), "distance": round(item[1], 1)}
+    )
+
+@places_router.get("/within", response_model=List[PlaceSummary])
+async def get_places_within(min_lat: float = Query(..., ge=-90, le=90),
+                            min_lon: float = Query(..., ge=-180, le=180),
+                            max_lat: float = Query(..., ge=-90, le=90),
+                            max_lon: float = Query(..., ge=-180, le=180),
+                            limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                            city: Optional[str] = Query(None)):
+    places = await PlaceCrud.get_places_in_bbox(min_lat, min_lon, max_lat, max_lon, limit=limit, city=city)
+    return json_array_response(places, serialize_place_summary)
+
+@places_router.get("/clusters", response_model=MapClusters)
+async def get_place_clusters(bbox: str = Query(..., description="min_lat,min_lon,max_lat,max_lon"),
+                             zoom: int = Query(..., ge=0, le=MAX_ZOOM),
+                             city: Optional[str] = Query(None)):
+    try:
+        min_lat, min_lon, max_lat, max_lon = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректная область карты")
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        raise HTTPException(status_code=400, detail="Некорректная область карты")
+
+    clusters = await cluster_index.get_clusters(min_lat, min_lon, max_lat, max_lon, zoom, city=city)
+    return FastJSONResponse(clusters)
+
+@places_router.post("/import", response_model=PlaceImportResult, dependencies=[Depends(import_places_admission)])
+async def import_places_file(
+    file: UploadFile = File(...),
+    format: Optional[Literal["ndjson", "csv"]] = Query(None),
+    current_user: User = Depends(get_current_superuser)
+):
+    try:
+        fmt = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report = await import_places(stream, fmt)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Файл должен быть в кодировке UTF-8")
+    finally:
+        stream.detach()
+
+    if report.geocoding_pending:
+        await geocoding_queue.resume()
+    return report
+
+def export_response(rows, fmt: str, name: str) -> StreamingResponse:
+    media_type = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        rows,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+    )
+
+@places_router.get("/export")
+async def export_places_file(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    current_user: User = Depends(get_current_superuser)
+):
+    return export_response(export_places(format), format, "places")
+
+@places_router.get("/reviews/export")
+async def export_reviews_file(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    current_user: User = Depends(get_current_superuser)
+):
+    return export_response(export_reviews(format), format, "reviews")
 
 @places_router.get("/{place_id}", response_model=PlaceRead)
-async def get_place(place_id: int):
-    place = await PlaceCrud.get_place_by_id(place_id)
-    if not place:
-        raise HTTPException(status_code=404, detail="Место не найдено")
-    
-    place_data = serialize_place(place)
-    reviews = await ReviewCrud.get_reviews_by_place(place_id)
-    place_data["review_count"] = len(reviews)
-    place_data["average_rating"] = 0
-    for rev in reviews:
-        place_data["average_rating"] += rev.rating
-    if len(reviews):
-        place_data["average_rating"] /= len(reviews)
-    
-    return place_data
+async def get_place(place_id: int, request: Request):
+    async def load():
+        place = await PlaceCrud.get_place_by_id(place_id)
+        if not place:
+            raise HTTPException(status_code=404, detail="Место не найдено")
+        return PlaceRead(**serialize_place(place)), {}
+
+    return await response_cache.respond(request, ("place", place_id), (), load)
 
 @places_router.post("/{place_id}/reviews", response_model=ReviewRead)
 async def create_review(
@@ -160,26 +333,41 @@ async def create_review(
         raise HTTPException(status_code=400, detail=str(e))
 
 @places_router.get("/{place_id}/reviews", response_model=List[ReviewRead])
-async def get_place_reviews(place_id: int):
-    reviews = await ReviewCrud.get_reviews_by_place(place_id)
-    result = []
-    for review in reviews:
-        user = await UserCrud.get_user_by_id(review.user_id)
-        result.append({
-            "id": review.id,
-            "user_id": review.user_id,
-            "place_id": review.place_id,
-            "rating": review.rating,
-            "comment": review.comment,
-            "user_username": user.username if user else "Unknown",
-            "created_at": review.created_at
-        })
-    return result
+async def get_place_reviews(place_id: int,
+                            request: Request,
+                            limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+                            after: Optional[str] = Query(None),
+                            sort: Literal["newest", "rating"] = Query("newest")):
+    async def load():
+        try:
+            reviews, next_cursor = await ReviewCrud.get_reviews_by_place(
+                place_id, limit=limit, after=after, sort=sort
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        content = [
+            ReviewRead(
+                id=review.id,
+                user_id=review.user_id,
+                place_id=review.place_id,
+                rating=review.rating,
+                comment=review.comment,
+                user_username=username or "Unknown",
+                created_at=review.created_at
+            )
+            for review, username in reviews
+        ]
+        return content, cursor_headers(next_cursor)
+
+    return await response_cache.respond(
+        request, ("reviews", place_id), (limit, after, sort), load
+    )
 
 @places_router.post("/geocode/address")
 async def geocode_address(city: str = Form(...), address: str = Form(...)):
     try:
-        coordinates = asyncio.run(geocoder.geocode_address(city, address))
+        coordinates = await geocoder.geocode_address(city, address)
         if coordinates:
             return {
                 "success": True,
@@ -193,6 +381,10 @@ async def geocode_address(city: str = Form(...), address: str = Form(...)):
             }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка геокодирования: {str(e)}")
+
+@places_router.get("/geocode/stats")
+async def geocode_stats():
+    return geocoder.get_stats()
     
 @places_router.post("/{place_id}/geocode")
 async def geocode_place(place_id: int):
@@ -217,17 +409,12 @@ async def geocode_place(place_id: int):
 @places_router.post("/{place_id}/coordinates")
 async def save_place_coordinates(
     place_id: int,
-    data: dict,
+    data: PlaceCoordinates,
     current_user: User = Depends(get_current_user)
 ):
     place = await PlaceCrud.get_place_by_id(place_id)
     if not place:
         raise HTTPException(status_code=404, detail="Место не найдено")
     
-    async with new_session() as session:
-        place.latitude = data.get("latitude")
-        place.longitude = data.get("longitude")
-        await session.commit()
-        await session.refresh(place)
-        
-        return {"success": True, "message": "Координаты сохранены"}
\ No newline at end of file
+    await PlaceCrud.set_place_coordinates(place_id, data.latitude, data.longitude)
+    return {"success": True, "message": "Координаты сохранены"}
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 class PlaceBase(BaseModel):
@@ -12,16 +12,71 @@ class PlaceBase(BaseModel):
 class PlaceCreate(PlaceBase):
     photos: List[str] = Field(default_factory=list)
 
+class PlaceImport(PlaceCreate):
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+class PlaceCoordinates(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class PlaceImportResult(BaseModel):
+    imported: int
+    failed: int
+    geocoding_pending: int
+    errors: List[ImportRowError]
+
 class PlaceRead(PlaceBase):
     id: int
     photos: List[str]
+    photo_variants: List[Dict[str, str]] = Field(default_factory=list)
     average_rating: float
     review_count: int
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    is_favorite: bool = False
     created_at: datetime
     updated_at: datetime
 
+class PlaceSummary(BaseModel):
+    id: int
+    name: str
+    address: str
+    city: str
+    photos: List[str]
+    photo_variants: List[Dict[str, str]] = Field(default_factory=list)
+    average_rating: float
+    review_count: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    is_favorite: bool = False
+
+class NearbyPlace(PlaceSummary):
+    distance: float
+
+class MapCluster(BaseModel):
+    cell: str
+    count: int
+    lat: float
+    lon: float
+    top_id: int
+
+class MapPoint(BaseModel):
+    id: int
+    lat: float
+    lon: float
+    name: str
+
+class MapClusters(BaseModel):
+    zoom: int
+    precision: int
+    clusters: List[MapCluster]
+    points: List[MapPoint]
+
 class ReviewBase(BaseModel):
     rating: int = Field(..., ge=1, le=5)
     comment: str = Field(..., min_length=1)
@@ -0,0 +1,153 @@
+import asyncio
+import importlib.util
+import os
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete, insert, func
+
+from backend.database import new_session, read_session, Favorite, Review, PlaceNeighbor
+from backend.leases import acquire_lease, release_lease
+
+# numpy and scipy add a few hundred ms to every worker's startup, so they are imported on first use
+MATRIX_LIBS_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("numpy", "scipy"))
+
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", 50))
+RECOMMENDATIONS_MIN_SUPPORT = int(os.getenv("RECOMMENDATIONS_MIN_SUPPORT", 1))
+RECOMMENDATIONS_SHRINKAGE = float(os.getenv("RECOMMENDATIONS_SHRINKAGE", 10.0))
+RECOMMENDATIONS_REFRESH_INTERVAL = float(os.getenv("RECOMMENDATIONS_REFRESH_INTERVAL", 3600))
+FAVORITE_WEIGHT = 1.0
+REFRESH_LEASE = "place_neighbors"
+
+Interaction = Tuple[int, int, float]
+
+async def load_interactions() -> List[Interaction]:
+    values: Dict[Tuple[int, int], float] = {}
+    async with read_session() as session:
+        favorites = await session.stream(select(Favorite.user_id, Favorite.place_id))
+        async for user_id, place_id in favorites:
+            values[(user_id, place_id)] = values.get((user_id, place_id), 0.0) + FAVORITE_WEIGHT
+
+        reviews = await session.stream(select(Review.user_id, Review.place_id, Review.rating))
+        async for user_id, place_id, rating in reviews:
+            # 1-5 stars map to -1..1, so a poor review counts against similarity
+            values[(user_id, place_id)] = values.get((user_id, place_id), 0.0) + (rating - 3) / 2
+
+    return [(user_id, place_id, value) for (user_id, place_id), value in values.items()]
+
+def compute_neighbors(
+    interactions: List[Interaction],
+    top_k: int = RECOMMENDATIONS_TOP_K,
+    min_support: int = RECOMMENDATIONS_MIN_SUPPORT,
+    shrinkage: float = RECOMMENDATIONS_SHRINKAGE
+) -> List[Tuple[int, int, float]]:
+    interactions = [item for item in interactions if item[2] != 0]
+    if not interactions:
+        return []
+
+    import numpy as np
+    from scipy import sparse
+
+    user_ids = {user_id: index for index, user_id in enumerate(dict.fromkeys(item[0] for item in interactions))}
+    place_ids = list(dict.fromkeys(item[1] for item in interactions))
+    place_index = {place_id: index for index, place_id in enumerate(place_ids)}
+
+    rows = np.fromiter((user_ids[item[0]] for item in interactions), dtype=np.int64, count=len(interactions))
+    cols = np.fromiter((place_index[item[1]] for item in interactions), dtype=np.int64, count=len(interactions))
+    data = np.fromiter((item[2] for item in interactions), dtype=np.float64, count=len(interactions))
+    shape = (len(user_ids), len(place_ids))
+
+    ratings = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+    seen = sparse.csr_matrix((np.ones_like(data), (rows, cols)), shape=shape)
+
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0)).ravel())
+    inverse_norms = sparse.diags(np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0))
+
+    # Cosine similarity between place columns, damped for pairs with few common users
+    similarity = (inverse_norms @ (ratings.T @ ratings) @ inverse_norms).tocsr()
+    support = (seen.T @ seen).tocsr()
+    support.data = np.where(
+        support.data >= min_support, support.data / (support.data + shrinkage), 0.0
+    )
+    similarity = similarity.multiply(support).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+
+    neighbors = []
+    for row in range(similarity.shape[0]):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        scores = similarity.data[start:end]
+        columns = similarity.indices[start:end]
+        positive = scores > 0
+        scores, columns = scores[positive], columns[positive]
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+            scores, columns = scores[best], columns[best]
+        for column, score in zip(columns, scores):
+            neighbors.append((place_ids[row], place_ids[column], float(score)))
+    return neighbors
+
+async def rebuild_place_neighbors(batch_size: int = 1000) -> Optional[int]:
+    if not MATRIX_LIBS_AVAILABLE:
+        print("Для расчёта рекомендаций нужны numpy и scipy")
+        return None
+
+    interactions = await load_interactions()
+    neighbors = await asyncio.to_thread(compute_neighbors, interactions)
+
+    async with new_session() as session:
+        await session.execute(delete(PlaceNeighbor))
+        for start in range(0, len(neighbors), batch_size):
+            await session.execute(insert(PlaceNeighbor), [
+                {"place_id": place_id, "neighbor_id": neighbor_id, "score": score}
+                for place_id, neighbor_id, score in neighbors[start:start + batch_size]
+            ])
+        await session.commit()
+    return len(neighbors)
+
+async def interactions_signature() -> tuple:
+    async with read_session() as session:
+        favorites = (await session.execute(
+            select(func.count(), func.max(Favorite.created_at)).select_from(Favorite)
+        )).one()
+        reviews = (await session.execute(
+            select(func.count(), func.max(Review.id)).select_from(Review)
+        )).one()
+    return tuple(favorites) + tuple(reviews)
+
+class NeighborRefresher:
+    def __init__(self, interval: float = RECOMMENDATIONS_REFRESH_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._signature = None
+
+    def start(self):
+        if self._task is None and self.interval > 0 and MATRIX_LIBS_AVAILABLE:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await release_lease(REFRESH_LEASE)
+
+    async def refresh(self) -> Optional[int]:
+        signature = await interactions_signature()
+        if signature == self._signature:
+            return None
+        count = await rebuild_place_neighbors()
+        self._signature = signature
+        print(f"Пересчитаны похожие места: {count}")
+        return count
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Only one worker process rebuilds, the lease outlives a missed interval
+                if await acquire_lease(REFRESH_LEASE, self.interval * 2):
+                    await self.refresh()
+            except Exception as e:
+                print(f"Ошибка пересчёта рекомендаций: {str(e)}")
+
+neighbor_refresher = NeighborRefresher()
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import math
+import os
+import time
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from fastapi import Request, Response
+
+from backend.cache import TTLCache, MISSING
+from backend.cache_sync import cache_sync
+from backend.responses import dumps
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 300))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 2048))
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    modified_at: float
+    headers: Dict[str, str]
+
+    @property
+    def last_modified(self) -> str:
+        return formatdate(self.modified_at, usegmt=True)
+
+class ResponseCache:
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generations: Dict[Hashable, int] = {}
+        self._max_generations = maxsize
+        # Part of every key, so a build started before clear() cannot store its result afterwards
+        self._epoch = 0
+        # (tag, params) -> (etag, modified_at) of the last body built, kept across clear()
+        self._versions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "not_modified": 0}
+
+    def invalidate(self, *tags: Hashable, broadcast: bool = True):
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+        if len(self._generations) > self._max_generations:
+            self.clear(broadcast=False)
+        if broadcast:
+            cache_sync.publish("response", tags)
+
+    def clear(self, broadcast: bool = True):
+        self._epoch += 1
+        self._generations.clear()
+        self._cache.clear()
+        if broadcast:
+            cache_sync.publish("response")
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "size": len(self._cache), "inflight": len(self._inflight)}
+
+    async def respond(
+        self,
+        request: Request,
+        tag: Hashable,
+        params: Tuple,
+        load: Callable[[], Awaitable[Tuple[Any, Dict[str, str]]]]
+    ) -> Response:
+        key = (tag, self._epoch, self._generations.get(tag, 0), params)
+        entry = self._cache.get(key)
+        if entry is not MISSING:
+            self.stats["hits"] += 1
+        else:
+            task = self._inflight.get(key)
+            if task is None:
+                self.stats["misses"] += 1
+                task = asyncio.ensure_future(self._build(key, load))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                self.stats["coalesced"] += 1
+            entry = await asyncio.shield(task)
+
+        headers = {
+            **entry.headers,
+            "ETag": entry.etag,
+            "Last-Modified": entry.last_modified,
+            "Cache-Control": "no-cache",
+        }
+        if self._is_not_modified(request, entry):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    async def _build(self, key: Hashable, load) -> CachedResponse:
+        content, headers = await load()
+        body = dumps(content)
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        entry = CachedResponse(
+            body=body,
+            etag=etag,
+            modified_at=self._modified_at(key[0], key[3], etag),
+            headers=headers
+        )
+        if (self._epoch, self._generations.get(key[0], 0)) == key[1:3]:
+            self._cache.set(key, entry)
+        return entry
+
+    def _modified_at(self, tag: Hashable, params: Tuple, etag: str) -> float:
+        # Last-Modified has one-second granularity, so a changed body always moves it to a later second
+        now = time.time()
+        previous = self._versions.get((tag, params))
+        if previous is MISSING:
+            modified_at = now
+        elif previous[0] == etag:
+            modified_at = previous[1]
+        else:
+            modified_at = max(now, math.floor(previous[1]) + 1)
+        self._versions.set((tag, params), (etag, modified_at))
+        return modified_at
+
+    @staticmethod
+    def _is_not_modified(request: Request, entry: CachedResponse) -> bool:
+        # If-Modified-Since is ignored whenever If-None-Match is present (RFC 9110, 13.1.3)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or entry.etag in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(entry.modified_at) <= since
+        return False
+
+response_cache = ResponseCache()
+cache_sync.register(
+    "response",
+    lambda *tags: response_cache.invalidate(*tags, broadcast=False),
+    lambda: response_cache.clear(broadcast=False)
+)
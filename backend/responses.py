@@ -0,0 +1,49 @@
+import json
+import os
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_STREAM_THRESHOLD = int(os.getenv("JSON_STREAM_THRESHOLD", 1000))
+JSON_STREAM_CHUNK = 500
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return jsonable_encoder(value)
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def _encode_array(items: Sequence, serialize: Callable[[Any], dict]) -> Iterator[bytes]:
+    yield b"["
+    for start in range(0, len(items), JSON_STREAM_CHUNK):
+        chunk = b",".join(dumps(serialize(item)) for item in items[start:start + JSON_STREAM_CHUNK])
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]"
+
+def json_array_response(
+    items: Sequence,
+    serialize: Callable[[Any], dict],
+    headers: Optional[Dict[str, str]] = None
+):
+    # Rows come straight from the database, so response_model validation is skipped
+    if len(items) <= JSON_STREAM_THRESHOLD:
+        return FastJSONResponse([serialize(item) for item in items], headers=headers)
+    # Starlette runs sync iterators in a thread, so encoding stays off the event loop
+    return StreamingResponse(_encode_array(items, serialize), media_type="application/json", headers=headers)
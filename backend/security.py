@@ -1,9 +1,23 @@
 from argon2 import PasswordHasher
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import jwt
 import os
+import statistics
+import time
 from datetime import datetime, timedelta
 
-ph = PasswordHasher()
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 4))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", min(os.cpu_count() or 1, 4)))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", HASH_WORKERS * 8))
+
+ph = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM
+)
 JWT_SECRET = os.getenv("JWT_SECRET")
 
 PEPPER = os.getenv("PEPPER")
@@ -18,6 +32,84 @@ def verify_password(hashed: str, password: str) -> bool:
     except Exception:
         return False
 
+def needs_rehash(hashed: str) -> bool:
+    try:
+        return ph.check_needs_rehash(hashed)
+    except Exception:
+        return False
+
+class HasherBusy(Exception):
+    pass
+
+class HashingPool:
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.stats = {"completed": 0, "rejected": 0, "max_in_flight": 0}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.queue_limit:
+            self.stats["rejected"] += 1
+            raise HasherBusy("Сервер перегружен, повторите попытку позже")
+
+        self.in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.stats["completed"] += 1
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - self.workers, 0),
+        }
+
+hashing_pool = HashingPool()
+
+async def hash_password_async(password: str) -> str:
+    return await hashing_pool.run(hash_password, password)
+
+async def verify_password_async(hashed: str, password: str) -> bool:
+    return await hashing_pool.run(verify_password, hashed, password)
+
+def calibrate_hasher(target_ms: float, max_memory_kib: int = 262144, parallelism: int = ARGON2_PARALLELISM,
+                     samples: int = 5) -> dict:
+    def measure(time_cost: int, memory_cost: int) -> float:
+        hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            hasher.hash("calibration-password")
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    memory_cost = max_memory_kib
+    while memory_cost > 8 * parallelism and measure(1, memory_cost) > target_ms:
+        memory_cost //= 2
+
+    time_cost = 1
+    elapsed = measure(time_cost, memory_cost)
+    while elapsed < target_ms:
+        candidate = measure(time_cost + 1, memory_cost)
+        if candidate > target_ms * 1.1:
+            break
+        time_cost += 1
+        elapsed = candidate
+
+    return {
+        "time_cost": time_cost,
+        "memory_cost": memory_cost,
+        "parallelism": parallelism,
+        "elapsed_ms": round(elapsed, 1),
+    }
+
 def create_jwt_token(data: dict, expires_minutes=1440):
     payload = data.copy()
     payload["exp"] = datetime.utcnow() + timedelta(minutes=expires_minutes)
@@ -0,0 +1,241 @@
+import array
+import bisect
+import json
+import mmap
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func
+
+from backend.database import read_session, Place, PlaceToken
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv("SNAPSHOT_CHECK_INTERVAL", 5))
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", 2))
+SNAPSHOT_FORMAT = 2
+POINTER_FILE = "CURRENT"
+INDEX_FILE = "index.bin"
+META_FILE = "meta.json"
+
+# Section name -> array typecode; all sections live in one file mapped by every worker
+SECTIONS = (
+    ("place_ids", "I"),
+    ("city_codes", "H"),
+    ("token_offsets", "I"),
+    ("posting_offsets", "I"),
+    ("postings", "I"),
+    ("token_bytes", "B"),
+)
+
+class _TokenTable:
+    def __init__(self, data: memoryview, offsets: memoryview):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]])
+
+class IndexSnapshot:
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["format"] != SNAPSHOT_FORMAT or self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Несовместимый снимок индекса: {path}")
+
+        self.path = path
+        self.version: int = self.meta["version"]
+        self.max_place_id: int = self.meta["max_place_id"]
+        self.cities: List[str] = self.meta["cities"]
+        self._city_codes = {city: code for code, city in enumerate(self.cities)}
+
+        with open(os.path.join(path, INDEX_FILE), "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        sections = {}
+        for name, typecode in SECTIONS:
+            offset, length = self.meta["sections"][name]
+            sections[name] = buffer[offset:offset + length].cast(typecode)
+
+        self.place_ids = sections["place_ids"]
+        self.city_codes = sections["city_codes"]
+        self._posting_offsets = sections["posting_offsets"]
+        self._postings = sections["postings"]
+        self._tokens = _TokenTable(sections["token_bytes"], sections["token_offsets"])
+
+    @property
+    def token_count(self) -> int:
+        return len(self._tokens)
+
+    def postings(self, token: str) -> memoryview:
+        key = token.encode("utf-8")
+        index = bisect.bisect_left(self._tokens, key)
+        if index == len(self._tokens) or self._tokens[index] != key:
+            return self._postings[0:0]
+        return self._postings[self._posting_offsets[index]:self._posting_offsets[index + 1]]
+
+    def city_code(self, city: str) -> Optional[int]:
+        return self._city_codes.get(city)
+
+    def position(self, place_id: int) -> Optional[int]:
+        index = bisect.bisect_left(self.place_ids, place_id)
+        if index < len(self.place_ids) and self.place_ids[index] == place_id:
+            return index
+        return None
+
+    def get_stats(self) -> dict:
+        return {
+            "version": self.version,
+            "places": len(self.place_ids),
+            "tokens": self.token_count,
+            "postings": len(self._postings),
+            "max_place_id": self.max_place_id,
+            "age_seconds": round(time.time() - self.meta["built_at"], 1),
+        }
+
+class SnapshotStore:
+    def __init__(self, directory: str = SNAPSHOT_DIR, check_interval: float = SNAPSHOT_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._pointer: Optional[str] = None
+        self._checked_at = 0.0
+        self.stats = {"loads": 0, "load_errors": 0}
+
+    def current(self) -> Optional[IndexSnapshot]:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._reload()
+        return self._snapshot
+
+    def _reload(self):
+        try:
+            with open(os.path.join(self.directory, POINTER_FILE), encoding="utf-8") as f:
+                pointer = f.read().strip()
+        except FileNotFoundError:
+            pointer = None
+        if pointer == self._pointer:
+            return
+
+        if pointer is None:
+            self._snapshot = None
+        else:
+            try:
+                # The previous mapping is released once requests still using it finish
+                self._snapshot = IndexSnapshot(os.path.join(self.directory, pointer))
+                self.stats["loads"] += 1
+                print(f"Загружен снимок индекса {pointer}")
+            except (OSError, ValueError, KeyError) as e:
+                self.stats["load_errors"] += 1
+                print(f"Ошибка загрузки снимка индекса {pointer}: {str(e)}")
+                return
+        self._pointer = pointer
+
+    def get_stats(self) -> dict:
+        snapshot = self.current()
+        return {**self.stats, **(snapshot.get_stats() if snapshot else {"version": 0})}
+
+def _write_sections(path: str, arrays: Dict[str, array.array]) -> Dict[str, Tuple[int, int]]:
+    sections = {}
+    offset = 0
+    with open(path, "wb") as f:
+        for name, _ in SECTIONS:
+            data = arrays[name].tobytes()
+            sections[name] = (offset, len(data))
+            f.write(data)
+            padding = -len(data) % 8
+            f.write(b"\0" * padding)
+            offset += len(data) + padding
+        f.flush()
+        os.fsync(f.fileno())
+    return sections
+
+async def _load_arrays(max_place_id: int) -> Tuple[Dict[str, array.array], List[str]]:
+    arrays = {name: array.array(typecode) for name, typecode in SECTIONS}
+    cities: Dict[str, int] = {}
+
+    async with read_session() as session:
+        rows = await session.stream(
+            select(Place.id, Place.city).where(Place.id <= max_place_id).order_by(Place.id)
+        )
+        async for place_id, city in rows:
+            arrays["place_ids"].append(place_id)
+            arrays["city_codes"].append(cities.setdefault(city, len(cities)))
+
+        postings: Dict[bytes, List[int]] = {}
+        rows = await session.stream(
+            select(PlaceToken.token, PlaceToken.place_id).where(PlaceToken.place_id <= max_place_id)
+        )
+        async for token, place_id in rows:
+            postings.setdefault(token.encode("utf-8"), []).append(place_id)
+
+    arrays["token_offsets"].append(0)
+    arrays["posting_offsets"].append(0)
+    for token in sorted(postings):
+        arrays["token_bytes"].frombytes(token)
+        arrays["token_offsets"].append(len(arrays["token_bytes"]))
+        arrays["postings"].extend(sorted(postings[token]))
+        arrays["posting_offsets"].append(len(arrays["postings"]))
+    return arrays, list(cities)
+
+def _published_versions(directory: str) -> List[int]:
+    versions = []
+    for name in os.listdir(directory):
+        if name.startswith("v") and name[1:].isdigit():
+            versions.append(int(name[1:]))
+    return sorted(versions)
+
+async def build_snapshot(directory: str = SNAPSHOT_DIR, keep: int = SNAPSHOT_KEEP) -> dict:
+    os.makedirs(directory, exist_ok=True)
+    started = time.time()
+    async with read_session() as session:
+        max_place_id = (await session.execute(select(func.max(Place.id)))).scalar() or 0
+    # Places added after this point are served from the database until the next build
+    arrays, cities = await _load_arrays(max_place_id)
+
+    version = (_published_versions(directory) or [0])[-1] + 1
+    name = f"v{version}"
+    staging = os.path.join(directory, f".{name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "built_at": started,
+        "created": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        "byteorder": sys.byteorder,
+        "max_place_id": max_place_id,
+        "cities": cities,
+        "sections": _write_sections(os.path.join(staging, INDEX_FILE), arrays),
+    }
+    with open(os.path.join(staging, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(staging, os.path.join(directory, name))
+
+    # Workers pick up the new version on their next pointer check
+    pointer = os.path.join(directory, f".{POINTER_FILE}.tmp")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(directory, POINTER_FILE))
+
+    for old in _published_versions(directory)[:-keep]:
+        shutil.rmtree(os.path.join(directory, f"v{old}"), ignore_errors=True)
+
+    return {
+        "version": version,
+        "places": len(arrays["place_ids"]),
+        "tokens": len(arrays["token_offsets"]) - 1,
+        "postings": len(arrays["postings"]),
+    }
+
+index_snapshots = SnapshotStore()
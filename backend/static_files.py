@@ -0,0 +1,29 @@
+import os
+import re
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+CONTENT_HASH = re.compile(r"[0-9a-f]{64}(_[a-z]+)?")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+class ContentAddressedStaticFiles(StaticFiles):
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        headers = {"cache-control": IMMUTABLE_CACHE_CONTROL}
+        name = os.path.basename(full_path).split(".")[0]
+        if CONTENT_HASH.fullmatch(name):
+            headers["etag"] = f'"{name}"'
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
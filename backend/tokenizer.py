@@ -0,0 +1,37 @@
+import os
+import re
+from functools import lru_cache
+from typing import FrozenSet, List
+
+STOPWORDS_PATH = os.path.join(os.path.dirname(__file__), "data", "russian_stopwords.txt")
+WORD_PATTERN = re.compile(r"[а-яёa-z]{3,}")
+
+@lru_cache(maxsize=1)
+def get_stemmer():
+    # nltk is slow to import, so it is loaded on first use
+    from nltk.stem.snowball import SnowballStemmer
+    return SnowballStemmer("russian")
+
+@lru_cache(maxsize=1)
+def get_stop_words() -> FrozenSet[str]:
+    with open(STOPWORDS_PATH, encoding="utf-8") as f:
+        return frozenset(line.strip() for line in f if line.strip())
+
+@lru_cache(maxsize=100_000)
+def stem(word: str) -> str:
+    return get_stemmer().stem(word)
+
+def stem_words(text: str) -> List[str]:
+    stop_words = get_stop_words()
+    return [
+        stem(word)
+        for word in WORD_PATTERN.findall(text.lower())
+        if word not in stop_words
+    ]
+
+def extract_tokens(text: str) -> List[str]:
+    return list(set(stem_words(text)))
+
+def warm_up():
+    get_stop_words()
+    stem("места")
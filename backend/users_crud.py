@@ -1,21 +1,48 @@
-from sqlalchemy import select
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
-from backend.database import User, new_session
+from backend.database import User, Place, Favorite, new_session, read_session
 from backend.users_schemas import UserCreate
-from backend.security import hash_password
-from typing import List
+from backend.security import hash_password_async
+from backend.cache import TTLCache, MISSING
+from backend.cache_sync import cache_sync
+from typing import List, Set
+from datetime import datetime
+import os
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
 
 class UserCrud:
+    _cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+    @classmethod
+    async def get_cached_user(cls, user_id: int) -> User | None:
+        user = cls._cache.get(user_id)
+        if user is not MISSING:
+            return user
+
+        user = await cls.get_user_by_id(user_id)
+        if user:
+            cls._cache.set(user_id, user)
+        return user
+
+    @classmethod
+    def invalidate_user(cls, user_id: int, broadcast: bool = True):
+        cls._cache.pop(user_id)
+        if broadcast:
+            cache_sync.publish("users", [user_id])
+
     @classmethod
     async def get_user_by_email(cls, email: str) -> User | None:
-        async with new_session() as session:
+        async with read_session() as session:
             query = select(User).where(User.email == email)
             result = await session.execute(query)
             return result.scalar_one_or_none()
         
     @classmethod
     async def get_user_by_id(cls, user_id: int) -> User | None:
-        async with new_session() as session:
+        async with read_session() as session:
             query = select(User).where(User.id == user_id)
             result = await session.execute(query)
             return result.scalar_one_or_none()
@@ -29,7 +56,7 @@ class UserCrud:
 
             try:               
                 user_dict = data.model_dump()
-                user_dict["password_hash"] = hash_password(user_dict.pop("password"))
+                user_dict["password_hash"] = await hash_password_async(user_dict.pop("password"))
 
                 user = User(**user_dict)
                 session.add(user)
@@ -45,45 +72,66 @@ class UserCrud:
                 raise e
             
     @classmethod
-    async def add_favorite_place(cls, user_id: int, place_id: int) -> User:
+    async def update_password_hash(cls, user_id: int, password_hash: str):
         async with new_session() as session:
-            query = select(User).where(User.id == user_id)
-            result = await session.execute(query)
-            user = result.scalar_one_or_none()
-            if place_id not in user.favorite_places:
-                user.favorite_places = user.favorite_places + [place_id]
-                await session.commit()
-                await session.refresh(user)
-            return user
+            await session.execute(
+                update(User).where(User.id == user_id).values(password_hash=password_hash)
+            )
+            await session.commit()
+        cls.invalidate_user(user_id)
 
     @classmethod
-    async def remove_favorite_place(cls, user_id: int, place_id: int) -> User:
+    async def add_favorite_place(cls, user_id: int, place_id: int) -> bool:
         async with new_session() as session:
-            query = select(User).where(User.id == user_id)
-            result = await session.execute(query)
-            user = result.scalar_one_or_none()
-            if place_id in user.favorite_places:
-                user.favorite_places = [pid for pid in user.favorite_places if pid != place_id]
-                await session.commit()
-                await session.refresh(user)
-            return user
+            result = await session.execute(
+                sqlite_insert(Favorite)
+                .values(user_id=user_id, place_id=place_id, created_at=datetime.now())
+                .on_conflict_do_nothing()
+            )
+            await session.commit()
+            return result.rowcount > 0
 
     @classmethod
-    async def get_favorite_places(cls, user_id: int) -> List[int]:
+    async def remove_favorite_place(cls, user_id: int, place_id: int) -> bool:
         async with new_session() as session:
-            query = select(User).where(User.id == user_id)
+            result = await session.execute(
+                delete(Favorite).where(Favorite.user_id == user_id, Favorite.place_id == place_id)
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    @classmethod
+    async def get_favorite_places(cls, user_id: int) -> List[Place]:
+        async with read_session() as session:
+            query = (
+                select(Place)
+                .join(Favorite, Favorite.place_id == Place.id)
+                .where(Favorite.user_id == user_id)
+                .order_by(Favorite.created_at, Place.id)
+            )
             result = await session.execute(query)
-            user = result.scalar_one_or_none()
-            return user.favorite_places
+            return list(result.scalars().all())
     
     @classmethod
     async def is_favorite_place(cls, user_id: int, place_id: int) -> bool:
-        async with new_session() as session:
-            query = select(User).where(User.id == user_id)
-            result = await session.execute(query)
-            user = result.scalar_one_or_none()
-        
-            if not user:
-                return False
+        statuses = await cls.get_favorite_statuses(user_id, [place_id])
+        return place_id in statuses
+
+    @classmethod
+    async def get_favorite_statuses(cls, user_id: int, place_ids: List[int]) -> Set[int]:
+        favorites = set()
+        async with read_session() as session:
+            for start in range(0, len(place_ids), 500):
+                query = select(Favorite.place_id).where(
+                    Favorite.user_id == user_id,
+                    Favorite.place_id.in_(place_ids[start:start + 500])
+                )
+                result = await session.execute(query)
+                favorites.update(result.scalars().all())
+        return favorites
+
+def _invalidate_users(*user_ids: int):
+    for user_id in user_ids:
+        UserCrud.invalidate_user(user_id, broadcast=False)
 
-            return place_id in user.favorite_places
+cache_sync.register("users", _invalidate_users, UserCrud._cache.clear)
@@ -1,14 +1,25 @@
-from typing import Annotated
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Annotated, List
+from fastapi import APIRouter, HTTPException, Depends, Query
 from backend.users_crud import UserCrud
-from backend.places_crud import ReviewCrud
-from backend.security import create_jwt_token, verify_password
+from backend.security import (
+    create_jwt_token, verify_password_async, hash_password_async, needs_rehash, HasherBusy
+)
 from backend.users_schemas import UserCreate, UserRead
 from backend.database import new_session, User
 from backend.dependencies import get_current_user
+from backend.responses import json_array_response
+from backend.admission import AdmissionPolicy
 
 user_router = APIRouter()
 
+# Argon2 hashing behind these routes is deliberately slow; limit attempts per client address
+login_admission = AdmissionPolicy(
+    "login", concurrency=8, max_queue=16, queue_timeout=3.0, rate=0.5, burst=10, key="ip"
+)
+register_admission = AdmissionPolicy(
+    "register", concurrency=4, max_queue=8, queue_timeout=3.0, rate=0.2, burst=10, key="ip"
+)
+
 def get_db():
     db = new_session()
     try:
@@ -16,21 +27,35 @@ def get_db():
     finally:
         db.close()
 
-@user_router.post("/register/")
+def hasher_busy(e: HasherBusy) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+@user_router.post("/register/", dependencies=[Depends(register_admission)])
 async def register(data: UserCreate):
     try:
         user = await UserCrud.create_user(data)
+    except HasherBusy as e:
+        raise hasher_busy(e)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=ve)
     return {"email": user.email, "username": user.username}
 
-@user_router.post("/login/")
+@user_router.post("/login/", dependencies=[Depends(login_admission)])
 async def login(data: UserRead):
     user = await UserCrud.get_user_by_email(data.email)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(user.password_hash, data.password):
+    try:
+        verified = await verify_password_async(user.password_hash, data.password)
+    except HasherBusy as e:
+        raise hasher_busy(e)
+    if not verified:
         raise HTTPException(status_code=403, detail="Invalid credentials")
+    if needs_rehash(user.password_hash):
+        try:
+            await UserCrud.update_password_hash(user.id, await hash_password_async(data.password))
+        except HasherBusy:
+            pass
     token = create_jwt_token({"email": user.email, "user_id": user.id})
     return {"access_token": token, "token_type": "bearer"}
 
@@ -58,26 +83,18 @@ async def remove_favorite(
 
 @user_router.get("/favorites")
 async def get_favorites(current_user: User = Depends(get_current_user)):
-    favorite_place_ids = await UserCrud.get_favorite_places(current_user.id)
-    
-    from backend.places_crud import PlaceCrud
     from backend.places_router import serialize_place
     
-    places = []
-    for place_id in favorite_place_ids:
-        place = await PlaceCrud.get_place_by_id(place_id)
-        if place:
-            place_data = serialize_place(place)
-            reviews = await ReviewCrud.get_reviews_by_place(place_id)
-            place_data["review_count"] = len(reviews)
-            place_data["average_rating"] = 0
-            for rev in reviews:
-                place_data["average_rating"] += rev.rating
-            if len(reviews):
-                place_data["average_rating"] /= len(reviews)
-            places.append(place_data)
-    
-    return places
+    places = await UserCrud.get_favorite_places(current_user.id)
+    return json_array_response(places, lambda place: {**serialize_place(place), "is_favorite": True})
+
+@user_router.get("/favorites/status")
+async def get_favorite_statuses(
+    ids: List[int] = Query(..., max_length=500),
+    current_user: User = Depends(get_current_user)
+):
+    favorites = await UserCrud.get_favorite_statuses(current_user.id, ids)
+    return {"is_favorite": {place_id: place_id in favorites for place_id in ids}}
 
 @user_router.get("/favorites/{place_id}/status")
 async def get_favorite_status(
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+CITIES = {
+    "Москва": (55.7558, 37.6173),
+    "Санкт-Петербург": (59.9343, 30.3351),
+    "Казань": (55.7963, 49.1088),
+    "Новосибирск": (55.0084, 82.9357),
+    "Екатеринбург": (56.8389, 60.6057),
+    "Нижний Новгород": (56.2965, 43.9361),
+    "Самара": (53.1959, 50.1002),
+    "Ростов-на-Дону": (47.2357, 39.7015),
+    "Калининград": (54.7104, 20.4522),
+    "Владивосток": (43.1155, 131.8855),
+    "Ярославль": (57.6261, 39.8845),
+    "Сочи": (43.5855, 39.7231),
+}
+
+PLACE_TYPES = ["Кафе", "Кофейня", "Ресторан", "Музей", "Галерея", "Парк", "Театр", "Бар", "Пекарня", "Библиотека"]
+ADJECTIVES = ["Уютный", "Старый", "Северный", "Зелёный", "Тихий", "Городской", "Речной", "Солнечный", "Белый", "Дружный"]
+NOUNS = ["дворик", "причал", "сад", "квартал", "маяк", "бульвар", "мост", "двор", "очаг", "берег"]
+STREETS = ["ул. Ленина", "ул. Пушкина", "пр. Мира", "ул. Гагарина", "Набережная ул.", "ул. Советская", "ул. Садовая", "пр. Победы"]
+DESCRIPTION_PARTS = [
+    "Уютное место с авторской кухней и свежей выпечкой каждое утро",
+    "Большая экспозиция по истории города и края",
+    "Тихий зал для чтения и работы с ноутбуком",
+    "Летняя веранда с видом на реку и живая музыка по выходным",
+    "Крепкий кофе, десерты и завтраки весь день",
+    "Прогулочные дорожки, велосипеды напрокат и каток зимой",
+    "Современное искусство и выставки молодых художников",
+    "Спектакли для взрослых и детей, экскурсии за кулисы",
+    "Домашние пироги, травяной чай и дружелюбный персонал",
+    "Панорамный вид на старый город и исторический центр",
+]
+COMMENTS = [
+    "Очень понравилось, обязательно вернёмся",
+    "Хорошее место, но долго ждали заказ",
+    "Отличная атмосфера и вежливый персонал",
+    "Ничего особенного, цены завышены",
+    "Лучшее место в городе для прогулки",
+    "Было шумно, зато вкусно",
+    "Интересная экспозиция, советую экскурсию",
+]
+
+@dataclass
+class Dataset:
+    place_ids: List[int] = field(default_factory=list)
+    user_ids: List[int] = field(default_factory=list)
+    cities: List[str] = field(default_factory=list)
+    coordinates: Dict[int, Tuple[float, float]] = field(default_factory=dict)
+    reviewed: set = field(default_factory=set)
+
+def make_place(rng: random.Random, city: str, created_at: datetime) -> dict:
+    latitude, longitude = CITIES[city]
+    return {
+        "name": f"{rng.choice(PLACE_TYPES)} «{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}»",
+        "description": ". ".join(rng.sample(DESCRIPTION_PARTS, 2)),
+        "address": f"{rng.choice(STREETS)}, {rng.randint(1, 150)}",
+        "city": city,
+        "contacts": f"+7 9{rng.randint(10, 99)} {rng.randint(100, 999)} {rng.randint(10, 99)} {rng.randint(10, 99)}",
+        "photos": [],
+        "latitude": latitude + rng.uniform(-0.1, 0.1),
+        "longitude": longitude + rng.uniform(-0.15, 0.15),
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+async def generate(
+    places: int = 2000,
+    cities: int = 10,
+    users: int = 500,
+    reviews: int = 10000,
+    favorites_per_user: int = 10,
+    seed: int = 42,
+    batch_size: int = 1000
+) -> Dataset:
+    from sqlalchemy import insert, select
+
+    from backend.database import new_session, Place, User, Review, Favorite
+    from backend.places_crud import PlaceCrud, ReviewCrud
+    from backend.recommendations import rebuild_place_neighbors
+    from backend.security import hash_password
+
+    rng = random.Random(seed)
+    dataset = Dataset(cities=list(CITIES)[:cities])
+    now = datetime.now()
+
+    async with new_session() as session:
+        for start in range(0, places, batch_size):
+            rows = [
+                make_place(rng, rng.choice(dataset.cities), now - timedelta(minutes=index))
+                for index in range(start, min(start + batch_size, places))
+            ]
+            await session.execute(insert(Place), rows)
+        await session.commit()
+
+        for place_id, latitude, longitude in await session.execute(
+            select(Place.id, Place.latitude, Place.longitude).order_by(Place.id)
+        ):
+            dataset.place_ids.append(place_id)
+            dataset.coordinates[place_id] = (latitude, longitude)
+
+        password_hash = hash_password("benchmark")
+        await session.execute(insert(User), [
+            {
+                "email": f"user{index}@example.ru",
+                "username": f"Пользователь {index}",
+                "password_hash": password_hash,
+                "is_active": True,
+                "is_superuser": False,
+                "favorite_places": [],
+                "created_at": now,
+                "updated_at": now,
+            }
+            for index in range(users)
+        ])
+        await session.commit()
+        dataset.user_ids = list((await session.execute(select(User.id).order_by(User.id))).scalars())
+
+        # Popular places get most of the favorites and reviews, as in real traffic
+        weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(dataset.place_ids))]
+        favorites = set()
+        for user_id in dataset.user_ids:
+            for place_id in rng.choices(dataset.place_ids, weights=weights, k=favorites_per_user):
+                favorites.add((user_id, place_id))
+        await session.execute(insert(Favorite), [
+            {"user_id": user_id, "place_id": place_id, "created_at": now}
+            for user_id, place_id in favorites
+        ])
+
+        review_rows = []
+        attempts = 0
+        while len(review_rows) < reviews and attempts < reviews * 5:
+            attempts += 1
+            pair = (rng.choice(dataset.user_ids), rng.choices(dataset.place_ids, weights=weights)[0])
+            if pair in dataset.reviewed:
+                continue
+            dataset.reviewed.add(pair)
+            created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            review_rows.append({
+                "user_id": pair[0],
+                "place_id": pair[1],
+                "rating": rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 2, 4, 5])[0],
+                "comment": rng.choice(COMMENTS),
+                "created_at": created_at,
+                "updated_at": created_at,
+            })
+        for start in range(0, len(review_rows), batch_size):
+            await session.execute(insert(Review), review_rows[start:start + batch_size])
+        await session.commit()
+
+    await PlaceCrud.rebuild_text_index()
+    await PlaceCrud.rebuild_geohash_index()
+    await ReviewCrud.reconcile_place_ratings()
+    await rebuild_place_neighbors()
+    return dataset
+
+async def seed_database(args):
+    from backend.migrations import migrate
+
+    await migrate()
+    dataset = await generate(
+        places=args.places,
+        cities=args.cities,
+        users=args.users,
+        reviews=args.reviews,
+        favorites_per_user=args.favorites_per_user,
+        seed=args.seed
+    )
+    print(
+        f"Создано мест: {len(dataset.place_ids)}, пользователей: {len(dataset.user_ids)}, "
+        f"отзывов: {len(dataset.reviewed)}"
+    )
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--places", type=int, default=2000)
+    parser.add_argument("--cities", type=int, default=10, choices=range(1, len(CITIES) + 1), metavar="1-12")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--reviews", type=int, default=10000)
+    parser.add_argument("--favorites-per-user", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.data",
+        description="Заполнить базу DB_NAME синтетическими данными"
+    )
+    add_dataset_arguments(parser)
+    asyncio.run(seed_database(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from benchmarks.data import CITIES, Dataset, add_dataset_arguments, generate, COMMENTS
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    make_request: Callable[[random.Random], dict]
+    authenticated: bool = True
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def stub_geocoder_response(request) -> dict:
+    # Deterministic coordinates instead of calls to the Yandex geocoder
+    digest = hashlib.sha1(request.url.params.get("geocode", "").encode("utf-8")).digest()
+    latitude = 55.0 + digest[0] / 255
+    longitude = 37.0 + digest[1] / 255
+    return {"response": {"GeoObjectCollection": {"featureMember": [
+        {"GeoObject": {"Point": {"pos": f"{longitude} {latitude}"}}}
+    ]}}}
+
+def sample_photo(rng: random.Random) -> bytes:
+    try:
+        from PIL import Image
+    except ImportError:
+        return rng.randbytes(2048)
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), tuple(rng.randrange(256) for _ in range(3))).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+def build_scenarios(dataset: Dataset) -> List[Scenario]:
+    unreviewed = (
+        (user_id, place_id)
+        for user_id, place_id in itertools.product(dataset.user_ids, reversed(dataset.place_ids))
+        if (user_id, place_id) not in dataset.reviewed
+    )
+
+    def create_review(rng):
+        user_id, place_id = next(unreviewed)
+        return {
+            "url": f"/api/places/{place_id}/reviews",
+            "json": {"rating": rng.randint(1, 5), "comment": rng.choice(COMMENTS), "place_id": place_id},
+            "user_id": user_id,
+        }
+
+    def nearby(rng):
+        latitude, longitude = dataset.coordinates[rng.choice(dataset.place_ids)]
+        return {"url": "/api/places/nearby", "params": {"lat": latitude, "lon": longitude, "radius": 2000}}
+
+    def map_clusters(rng):
+        city = rng.choice(dataset.cities)
+        latitude, longitude = CITIES[city]
+        zoom = rng.choice([10, 12, 14])
+        span = 0.3 / 2 ** ((zoom - 10) / 2)
+        bbox = [latitude - span / 2, longitude - span, latitude + span / 2, longitude + span]
+        return {
+            "url": "/api/places/clusters",
+            "params": {"bbox": ",".join(f"{value:.4f}" for value in bbox), "zoom": zoom, "city": city},
+        }
+
+    return [
+        Scenario("places_feed", "GET", lambda rng: {"url": "/api/places/", "params": {"limit": 50, "fields": "summary"}}),
+        Scenario("places_all", "GET", lambda rng: {"url": "/api/places/"}),
+        Scenario("places_city", "GET", lambda rng: {
+            "url": "/api/places/", "params": {"limit": 50, "fields": "summary", "city": rng.choice(dataset.cities)}
+        }),
+        Scenario("place_detail", "GET", lambda rng: {"url": f"/api/places/{rng.choice(dataset.place_ids)}"}, False),
+        Scenario("place_reviews", "GET", lambda rng: {
+            "url": f"/api/places/{rng.choice(dataset.place_ids[:100])}/reviews", "params": {"limit": 20}
+        }, False),
+        Scenario("cities", "GET", lambda rng: {"url": "/api/places/cities"}, False),
+        Scenario("search", "GET", lambda rng: {
+            "url": "/api/places/search", "params": {"q": rng.choice(["кофе", "музей истории", "парк", "выпечка"])}
+        }, False),
+        Scenario("nearby", "GET", nearby, False),
+        Scenario("map_clusters", "GET", map_clusters, False),
+        Scenario("favorites", "GET", lambda rng: {"url": "/api/favorites"}),
+        Scenario("favorite_toggle", "POST", lambda rng: {"url": f"/api/favorites/{rng.choice(dataset.place_ids)}"}),
+        Scenario("create_review", "POST", create_review),
+        Scenario("create_place", "POST", lambda rng: {
+            "url": "/api/places/",
+            "data": {
+                "name": "Новое место", "description": "Кофейня с выпечкой и летней верандой",
+                "address": f"ул. Ленина, {rng.randint(1, 500)}", "city": rng.choice(dataset.cities),
+                "contacts": "+7 900 000 00 00",
+            },
+            "files": [("photos", ("photo.jpg", sample_photo(rng), "image/jpeg"))],
+        }),
+    ]
+
+class QueryCounter:
+    def __init__(self, engines):
+        from sqlalchemy import event
+
+        self.count = 0
+        for engine in {id(engine): engine for engine in engines}.values():
+            event.listen(engine.sync_engine, "before_cursor_execute", self._increment)
+
+    def _increment(self, *args):
+        self.count += 1
+
+async def run_scenario(client, scenario: Scenario, tokens: Dict[int, str], user_ids: List[int],
+                       counter: QueryCounter, requests: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    shed = 0
+
+    async def send(request: dict):
+        nonlocal shed
+        request = dict(request)
+        user_id = request.pop("user_id", None) or rng.choice(user_ids)
+        headers = {"Authorization": f"Bearer {tokens[user_id]}"} if scenario.authenticated else {}
+        response = await client.request(scenario.method, headers=headers, **request)
+        # Requests rejected by admission control are counted, not treated as failures
+        if response.status_code in (429, 503) and "Retry-After" in response.headers:
+            shed += 1
+        elif response.status_code >= 400:
+            raise RuntimeError(f"{scenario.name}: {response.status_code} {response.text[:200]}")
+
+    for _ in range(min(5, requests)):
+        await send(scenario.make_request(rng))
+
+    latencies = []
+    queries = []
+    for _ in range(requests):
+        request = scenario.make_request(rng)
+        before = counter.count
+        started = time.perf_counter()
+        await send(request)
+        latencies.append(time.perf_counter() - started)
+        queries.append(counter.count - before)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    batch = [scenario.make_request(rng) for _ in range(requests)]
+
+    async def limited(request):
+        async with semaphore:
+            await send(request)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(request) for request in batch))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries": round(statistics.mean(queries), 2),
+        "rps": round(requests / elapsed, 1),
+        "shed": shed,
+    }
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {current[metric]}")
+        if current["queries"] > previous["queries"] + 0.5:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+        if current["rps"] < previous["rps"] * (1 - threshold):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+    return regressions
+
+async def benchmark(args) -> dict:
+    import httpx
+
+    from backend.database import engine, read_engine
+    from backend.geocoder import geocoder
+    from backend.main import app
+    from backend.migrations import migrate
+    from backend.security import create_jwt_token
+
+    await migrate()
+    started = time.perf_counter()
+    dataset = await generate(
+        places=args.places,
+        cities=args.cities,
+        users=args.users,
+        reviews=args.reviews,
+        favorites_per_user=args.favorites_per_user,
+        seed=args.seed
+    )
+    print(f"Данные сгенерированы за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+    geocoder.api_key = "benchmark"
+    geocoder._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json=stub_geocoder_response(request)))
+    )
+    tokens = {
+        user_id: create_jwt_token({"email": f"user{index}@example.ru", "user_id": user_id})
+        for index, user_id in enumerate(dataset.user_ids)
+    }
+    counter = QueryCounter([engine, read_engine])
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for scenario in build_scenarios(dataset):
+                if args.only and scenario.name not in args.only:
+                    continue
+                results[scenario.name] = await run_scenario(
+                    client, scenario, tokens, dataset.user_ids, counter,
+                    requests=args.requests, concurrency=args.concurrency, seed=args.seed
+                )
+                print(f"{scenario.name:>16}: {results[scenario.name]}", file=sys.stderr)
+    return results
+
+def print_table(results: dict):
+    print(f"{'endpoint':<16} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'запросов':>9} {'rps':>8} {'отказов':>8}")
+    for name, row in results.items():
+        print(
+            f"{name:<16} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+            f"{row['queries']:>9} {row['rps']:>8} {row.get('shed', 0):>8}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Нагрузочный прогон API на синтетических данных"
+    )
+    add_dataset_arguments(parser)
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", nargs="*", help="Запустить только указанные сценарии")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Файл с базовыми результатами")
+    parser.add_argument("--save-baseline", action="store_true", help="Сохранить результаты как базовые")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимое ухудшение, доля")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+    args.baseline = os.path.abspath(args.baseline)
+    args.output = args.output and os.path.abspath(args.output)
+
+    os.environ.update({"DB_NAME": "benchmark.db", "RECOMMENDATIONS_REFRESH_INTERVAL": "0"})
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret-key-0123456789abcdef")
+    os.environ.setdefault("PEPPER", "benchmark")
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="travel-guide-benchmark-") as workdir:
+        os.chdir(workdir)
+        os.makedirs("static/uploads")
+        try:
+            results = asyncio.run(benchmark(args))
+        finally:
+            os.chdir(cwd)
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Базовые результаты сохранены в {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("Ухудшения относительно базовых результатов:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("Ухудшений относительно базовых результатов нет")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import asyncio
+import json
+import time
+
+started = time.perf_counter()
+from backend.main import app
+imported = time.perf_counter()
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+booted = asyncio.run(boot())
+print(json.dumps({"import": imported - started, "boot": booted - imported, "total": booted - started}))
+"""
+
+def run_child(workdir: str, env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Завершиться с ошибкой, если медианный запуск дольше")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "static", "uploads"))
+        env = {
+            **os.environ,
+            "PYTHONPATH": ROOT,
+            "DB_NAME": "startup_benchmark.db",
+            "JWT_SECRET": os.getenv("JWT_SECRET", "startup-benchmark-secret-key-0123456789"),
+            "GEOCODE_WORKERS": "1",
+        }
+        subprocess.run(
+            [sys.executable, "-m", "backend.manage", "migrate"],
+            cwd=workdir, env=env, capture_output=True, check=True
+        )
+
+        runs = [run_child(workdir, env) for _ in range(args.runs)]
+
+    for stage in ("import", "boot", "total"):
+        values = [run[stage] for run in runs]
+        print(
+            f"{stage:>6}: медиана {statistics.median(values) * 1000:.0f} мс, "
+            f"максимум {max(values) * 1000:.0f} мс"
+        )
+
+    median_total = statistics.median(run["total"] for run in runs)
+    if args.max_seconds is not None and median_total > args.max_seconds:
+        print(f"Запуск медленнее {args.max_seconds} с")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()